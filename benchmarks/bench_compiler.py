@@ -0,0 +1,43 @@
+"""
+Compare speed of compiled expressions with that of the interpreter.
+
+Run as: python benchmarks/bench_compiler.py
+"""
+
+import datetime
+import timeit
+
+from dtcalc.compiler import compile_expr
+from dtcalc.lexeval import eval_postfix, parse
+
+TEMPLATES = [
+    "$ts + 30d",
+    "$ts - $start > 3d",
+    "$ts + 1mo - 2d <= $start + 1y",
+    "($ts - $start) + (1w + 2d + 3h) > 10w",
+]
+
+FIELDS = {
+    "ts": datetime.datetime(2021, 6, 1, 10, 30),
+    "start": datetime.datetime(2021, 5, 20),
+}
+
+NUMBER = 100000
+
+
+def main():
+    print(f"{'template':42} {'interp':>8} {'compiled':>8} {'speedup':>8}")
+    for template in TEMPLATES:
+        postfix = parse(template, "%Y/%m/%d")
+        compiled = compile_expr(template, "%Y/%m/%d")
+        assert compiled.token(FIELDS) == eval_postfix(postfix, FIELDS)
+
+        interp_time = timeit.timeit(lambda: eval_postfix(postfix, FIELDS),
+                                    number=NUMBER)
+        comp_time = timeit.timeit(lambda: compiled(FIELDS), number=NUMBER)
+        print(f"{template:42} {interp_time:8.3f} {comp_time:8.3f} "
+              f"{interp_time / comp_time:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,19 +2,164 @@
 dtcalc CLI interface
 """
 
+from typing import Iterable, Optional, Sequence
 import argparse
+import itertools
+import sys
+
+from dtcalc.errlog import ErrorLog
+from dtcalc.extsort import SortKey, sort_lines
+from dtcalc.lexeval import lexeval, try_compute, ErrorRecord, LexError
+from dtcalc.linefilter import LineFilter
+from dtcalc.stats import DurationStats
+from dtcalc import tokens
+
+
+def aggregate(lines: Iterable[str], in_dtfmt: str, errlog: ErrorLog) -> None:
+    """
+    Evaluate each line as an expression and print a summary of the
+    resultant durations.
+
+    Lines that are blank are skipped. Lines that are malformed or that
+    don't evaluate to a fixed length duration are noted in errlog and
+    otherwise ignored.
+    """
+    stats = DurationStats()
+    for lineno, line in enumerate(lines, 1):
+        line = line.rstrip("\n")
+        if not line.strip():
+            continue
+        result = try_compute(line, in_dtfmt)
+        if isinstance(result, ErrorRecord):
+            errlog.add(lineno, line, result)
+        elif isinstance(result, tokens.SUNIT) and not result.months:
+            stats.add(result.value)
+        else:
+            errlog.add(lineno, line, ErrorRecord(-1, -1, "result"))
+    if stats.count:
+        print(stats.summary())
+    else:
+        print("No durations to summarize")
+
+
+def filter_lines(lines: Iterable[str], expr: str, in_dtfmt: str,
+                 delimiter: Optional[str],
+                 names: Optional[Sequence[str]], errlog: ErrorLog) -> None:
+    """
+    Print lines for which the comparison expr holds.
+
+    Lines whose fields don't hold valid datetimes are noted in errlog.
+    """
+    try:
+        line_filter = LineFilter(expr, in_dtfmt, delimiter, names)
+    except (ValueError, OverflowError, LexError):
+        print("Error: Malformed input")
+        return
+    for lineno, line in enumerate(lines, 1):
+        res = line_filter.check(line.rstrip("\n"))
+        if res is True:
+            sys.stdout.write(line)
+        elif isinstance(res, ErrorRecord):
+            errlog.add(lineno, line.rstrip("\n"), res)
+
+
+def sort_command(argv: Sequence[str]) -> None:
+    """
+    Run the sort subcommand: print lines of the given files (or of
+    standard input) sorted by a key expression over their fields.
+
+    Arguments:
+      argv: command line arguments following 'sort'.
+    """
+    parser = argparse.ArgumentParser(
+        prog="dtcalc sort",
+        description="Sort lines by a datetime or duration computed from "
+                    "their fields, using temporary files for large "
+                    "inputs.")
+    parser.add_argument("--in-dtfmt", default="%Y/%m/%d")
+    parser.add_argument("--delimiter", default=None,
+                        help="field separator (default: white space)")
+    parser.add_argument("--fields", default=None,
+                        help="comma separated names of fields")
+    parser.add_argument("--unique", action="store_true",
+                        help="print only the first of lines with equal "
+                             "keys")
+    parser.add_argument("--buffer-lines", type=int, default=100000,
+                        help="number of lines sorted in memory at a time "
+                             "(default: 100000)")
+    parser.add_argument("--temp-dir", default=None,
+                        help="directory for temporary files")
+    parser.add_argument("--errors", type=argparse.FileType("w"),
+                        default=None,
+                        help="file to write records of failed lines to")
+    parser.add_argument("key", help="key expression, like '$ts + 5h'")
+    parser.add_argument("files", nargs="*", type=argparse.FileType("r"))
+
+    args = parser.parse_args(argv)
+    if args.buffer_lines < 1:
+        parser.error("--buffer-lines must be positive")
+    field_names = args.fields.split(",") if args.fields else None
+    try:
+        sort_key = SortKey(args.key, args.in_dtfmt, args.delimiter,
+                           field_names)
+    except (ValueError, OverflowError, LexError):
+        print("Error: Malformed input")
+        return
+    if args.files:
+        lines: Iterable[str] = itertools.chain.from_iterable(args.files)
+    else:
+        lines = sys.stdin
+    errors = ErrorLog(args.errors)
+    for line in sort_lines(lines, sort_key, args.buffer_lines, args.unique,
+                           args.temp_dir, errors.add):
+        print(line)
+    errors.report()
+    errors.close()
 
-from dtcalc.lexeval import lexeval, LexError
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["sort"]:
+        sort_command(sys.argv[2:])
+        sys.exit()
+
     parser = argparse.ArgumentParser()
     parser.add_argument("--in-dtfmt", default="%Y/%m/%d")
     parser.add_argument("--out-dtfmt", default="%Y/%m/%d")
-    parser.add_argument("input", nargs="+")
+    parser.add_argument("--aggregate", action="store_true",
+                        help="summarize durations of expressions read "
+                             "from standard input, one per line")
+    parser.add_argument("--filter", action="store_true",
+                        help="print lines of standard input for which the "
+                             "comparison in input holds")
+    parser.add_argument("--delimiter", default=None,
+                        help="field separator for --filter "
+                             "(default: white space)")
+    parser.add_argument("--fields", default=None,
+                        help="comma separated names of fields for --filter")
+    parser.add_argument("--errors", type=argparse.FileType("w"),
+                        default=None,
+                        help="file to write records of failed lines to, "
+                             "for --aggregate and --filter")
+    parser.add_argument("input", nargs="*")
 
     args = parser.parse_args()
-    try:
-        result = lexeval(args.input, args.in_dtfmt, args.out_dtfmt)
-        print(result)
-    except (ValueError, LexError):
-        print("Error: Malformed input")
+    if args.aggregate:
+        errors = ErrorLog(args.errors)
+        aggregate(sys.stdin, args.in_dtfmt, errors)
+        errors.report()
+        errors.close()
+    elif not args.input:
+        parser.error("input is required")
+    elif args.filter:
+        errors = ErrorLog(args.errors)
+        field_names = args.fields.split(",") if args.fields else None
+        filter_lines(sys.stdin, " ".join(args.input), args.in_dtfmt,
+                     args.delimiter, field_names, errors)
+        errors.report()
+        errors.close()
+    else:
+        try:
+            result = lexeval(args.input, args.in_dtfmt, args.out_dtfmt)
+            print(result)
+        except (ValueError, OverflowError, LexError):
+            print("Error: Malformed input")
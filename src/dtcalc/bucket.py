@@ -0,0 +1,131 @@
+"""
+Round datetimes and durations down or up to multiples of a fixed step,
+as in grouping timestamps into 15 minute or weekly windows.
+
+Rounding is done with integer arithmetic on microseconds: datetimes are
+converted to microseconds since 1970-01-01 with dt_to_us() and durations
+to their lengths in microseconds with td_to_us(). floor_us() and
+ceil_us() use only subtraction and modulo, so they work the same on
+Python integers and, element-wise, on NumPy integer arrays (like the
+int64 view of a datetime64[us] array).
+"""
+
+from typing import Callable, Optional, TypeVar, Union
+import datetime
+
+from dtcalc.stats import td_to_us
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# int, or anything supporting integer arithmetic element-wise, like a
+# NumPy array
+IntLike = TypeVar("IntLike")
+
+Rounder = Callable[[int, int, int], int]
+
+
+def dt_to_us(dtobj: datetime.datetime) -> int:
+    """
+    Convert a datetime to microseconds since 1970-01-01.
+
+    Aware datetimes are counted from 1970-01-01 UTC, so that values in
+    different time zones compare by the instant they stand for.
+    """
+    usecs = td_to_us(dtobj.replace(tzinfo=None) - EPOCH)
+    offset = dtobj.utcoffset()
+    if offset is not None:
+        # Not astimezone(), which fails near the ends of range
+        usecs -= td_to_us(offset)
+    return usecs
+
+
+def us_to_dt(usecs: int, tzinfo: Optional[datetime.tzinfo] = None
+             ) -> datetime.datetime:
+    """
+    Convert microseconds since 1970-01-01 to a datetime.
+
+    Arguments:
+      usecs: microseconds since 1970-01-01, UTC if tzinfo is given.
+      tzinfo: time zone of the result. None gives a naive datetime.
+
+    Raises:
+      OverflowError: when result is out of the range of datetime.
+    """
+    tdobj = datetime.timedelta(microseconds=usecs)
+    if tzinfo is None:
+        return EPOCH + tdobj
+    offset = tzinfo.utcoffset(None)
+    if offset is not None:
+        # Fixed offset, like from %z. Added before making the datetime,
+        # so that local times near the ends of range work.
+        return (EPOCH + (tdobj + offset)).replace(tzinfo=tzinfo)
+    return tzinfo.fromutc((EPOCH + tdobj).replace(tzinfo=tzinfo))
+
+
+def floor_us(usecs: IntLike, step: int, origin: int = 0) -> IntLike:
+    """
+    Round down to the nearest multiple of step counted from origin.
+
+    Arguments:
+      usecs: value(s) to be rounded, in microseconds.
+      step: positive step in microseconds.
+      origin: a value that is left unchanged, in microseconds.
+
+    Returns:
+      Largest origin + k * step (for integer k) not greater than usecs.
+    """
+    # Python and NumPy both give a result of % with the sign of the
+    # divisor, so this holds for values before origin as well
+    return usecs - (usecs - origin) % step  # type: ignore
+
+
+def ceil_us(usecs: IntLike, step: int, origin: int = 0) -> IntLike:
+    """
+    Round up to the nearest multiple of step counted from origin.
+
+    Arguments are as for floor_us().
+
+    Returns:
+      Smallest origin + k * step (for integer k) not less than usecs.
+    """
+    return usecs + (origin - usecs) % step  # type: ignore
+
+
+def round_value(rounder: Rounder,
+                value: Union[datetime.datetime, datetime.timedelta],
+                step: datetime.timedelta,
+                origin: Union[datetime.datetime, datetime.timedelta,
+                              None] = None
+                ) -> Union[datetime.datetime, datetime.timedelta]:
+    """
+    Round a datetime or a duration with floor_us() or ceil_us().
+
+    Arguments:
+      rounder: floor_us or ceil_us.
+      value: datetime or duration to be rounded.
+      step: step to round to.
+      origin: value of the same type as value from which steps are
+        counted. None means 1970-01-01 for datetimes and zero for
+        durations.
+
+    Returns:
+      Rounded value, of the same type as value. Aware datetimes are
+      rounded in UTC and keep their time zone, so floor(value, 1d) of
+      one is midnight UTC in its own time zone.
+
+    Raises:
+      ValueError: when step isn't positive.
+      OverflowError: when result is out of range.
+    """
+    step_us = td_to_us(step)
+    if step_us <= 0:
+        raise ValueError("Step must be positive!")
+    if isinstance(value, datetime.datetime):
+        assert not isinstance(origin, datetime.timedelta)
+        origin_us = dt_to_us(origin) if origin is not None else 0
+        return us_to_dt(rounder(dt_to_us(value), step_us, origin_us),
+                        value.tzinfo)
+    assert not isinstance(origin, datetime.datetime)
+    origin_us = td_to_us(origin) if origin is not None else 0
+    return datetime.timedelta(
+        microseconds=rounder(td_to_us(value), step_us, origin_us))
@@ -0,0 +1,72 @@
+"""
+Bounded cache for evaluation results.
+"""
+
+from typing import Any, Hashable, Optional
+import collections
+
+
+class ResultCache:
+    """
+    Least recently used (LRU) cache of evaluation results.
+
+    Meant to be passed to dtcalc.lexeval.lexeval() so that repeated
+    expressions need not be lexed and evaluated again.
+
+    Attributes:
+      maxsize: maximum number of entries retained.
+      hits: number of lookups that found an entry.
+      misses: number of lookups that did not find an entry.
+    """
+    def __init__(self, maxsize: int = 1024):
+        if maxsize < 1:
+            raise ValueError("Cache size must be positive!")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._store: "collections.OrderedDict[Hashable, Any]"
+        self._store = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Look up a cached result and mark it as most recently used.
+
+        Arguments:
+          key: key under which result was stored.
+
+        Returns:
+          Cached result if present, else None.
+        """
+        try:
+            val = self._store[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._store.move_to_end(key)
+        self.hits += 1
+        return val
+
+    def put(self, key: Hashable, val: Any) -> None:
+        """
+        Store a result, evicting the least recently used entry if the
+        cache is full.
+
+        Arguments:
+          key: key under which result is to be stored.
+          val: result to be stored.
+        """
+        self._store[key] = val
+        self._store.move_to_end(key)
+        if len(self._store) > self.maxsize:
+            self._store.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Remove all entries and reset the counters.
+        """
+        self._store.clear()
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,146 @@
+"""
+Integer arithmetic on civil (proleptic Gregorian) dates.
+
+Days are counted from 1970-01-01. The conversions follow
+http://howardhinnant.github.io/date_algorithms.html and use only integer
+operations, so each value takes constant time.
+"""
+
+from typing import Tuple
+import datetime
+
+# Number of days in each month of a non-leap year. Index 0 is unused.
+MONTH_DAYS = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+# Number of days before the first day of each month, counting from March
+# (as the algorithms below do). Index 0 is March.
+_DAYS_BEFORE_MONTH = (0, 31, 61, 92, 122, 153, 184, 214, 245, 275, 306, 337)
+
+# Proleptic Gregorian ordinal (as of datetime.date.toordinal()) of
+# 1970-01-01
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def is_leap(year: int) -> bool:
+    """
+    Check if year is a leap year.
+    """
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+
+def month_length(year: int, month: int) -> int:
+    """
+    Find the number of days in a month.
+
+    Arguments:
+      year: year
+      month: month (1-12)
+
+    Returns:
+      Number of days in the month.
+    """
+    if month == 2 and is_leap(year):
+        return 29
+    return MONTH_DAYS[month]
+
+
+def days_from_civil(year: int, month: int, day: int) -> int:
+    """
+    Convert a civil date to number of days since 1970-01-01.
+
+    Arguments:
+      year: year
+      month: month (1-12)
+      day: day of month (1-31)
+
+    Returns:
+      Number of days since 1970-01-01. Negative for earlier dates.
+    """
+    if month <= 2:
+        year -= 1
+    era = year // 400
+    yoe = year - era * 400  # [0, 399]
+    doy = _DAYS_BEFORE_MONTH[(month + 9) % 12] + day - 1  # [0, 365]
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy  # [0, 146096]
+    return era * 146097 + doe - 719468
+
+
+def civil_from_days(days: int) -> Tuple[int, int, int]:
+    """
+    Convert number of days since 1970-01-01 to a civil date.
+
+    Arguments:
+      days: number of days since 1970-01-01.
+
+    Returns:
+      Tuple of year, month (1-12) and day of month (1-31).
+    """
+    days += 719468
+    era = days // 146097
+    doe = days - era * 146097  # [0, 146096]
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)  # [0, 365]
+    mp = (5 * doy + 2) // 153  # [0, 11], March is 0
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = mp + 3 if mp < 10 else mp - 9
+    year = yoe + era * 400 + (month <= 2)
+    return year, month, day
+
+
+def shift_ym(year: int, month: int, months: int) -> Tuple[int, int]:
+    """
+    Move a (year, month) pair by a number of months.
+
+    Returns:
+      Resultant year and month (1-12).
+    """
+    year, month0 = divmod(year * 12 + month - 1 + months, 12)
+    return year, month0 + 1
+
+
+def shift_days(days: int, months: int) -> int:
+    """
+    Move a date, given as days since 1970-01-01, by a number of months.
+
+    Day of month is clamped to the last day of the resultant month, so
+    that 2021-01-31 plus one month is 2021-02-28.
+
+    Arguments:
+      days: number of days since 1970-01-01.
+      months: number of months to move by. May be negative.
+
+    Returns:
+      Number of days since 1970-01-01 of the resultant date.
+    """
+    year, month, day = civil_from_days(days)
+    year, month = shift_ym(year, month, months)
+    day = min(day, month_length(year, month))
+    return days_from_civil(year, month, day)
+
+
+def add_months(dtobj: datetime.datetime,
+               months: int) -> datetime.datetime:
+    """
+    Move a datetime by a number of months, keeping the time of day.
+
+    The date is moved with shift_days() on its number of days since
+    1970-01-01, so day of month is clamped like there.
+
+    Arguments:
+      dtobj: datetime to be moved.
+      months: number of months to move by. May be negative.
+
+    Returns:
+      Resultant datetime.
+
+    Raises:
+      ValueError: when result is out of the range of datetime.
+    """
+    if months == 0:
+        return dtobj
+    days = dtobj.toordinal() - _EPOCH_ORDINAL
+    try:
+        return dtobj + datetime.timedelta(days=shift_days(days, months)
+                                          - days)
+    except OverflowError as ovferr:
+        raise ValueError("Result out of range!") from ovferr
@@ -0,0 +1,310 @@
+"""
+Compile postfix expressions into Python closures.
+
+Interpreting a postfix expression with dtcalc.lexeval.eval_postfix()
+involves type checks and operator dispatch for every operation, every
+time. Compiling does them once: the types of all operands are known
+beforehand (fields always hold datetimes, with a time zone or without
+as given to compile_postfix()), so each operation becomes a
+closure doing just the arithmetic. Sub-expressions without fields are
+evaluated at compile time. The checks are those of the interpreter,
+dtcalc.lexeval.type_error() and dtcalc.lexeval.func_error(), so that the
+two accept the same expressions.
+"""
+
+from typing import (Any, Callable, Dict, List, Mapping, Optional, Tuple,
+                    Type)
+import datetime
+import functools
+import operator
+
+from dtcalc import tokens
+import dtcalc.bucket
+import dtcalc.civil
+import dtcalc.dtfmt
+import dtcalc.lexeval
+
+# Raw values of DTIME, SUNIT (fixed length part) and BOOL tokens
+RawValue = Any
+Env = Mapping[str, datetime.datetime]
+
+# Values of DTIME tokens made by _operand()
+_NAIVE = datetime.datetime(1970, 1, 1)
+_AWARE = _NAIVE.replace(tzinfo=datetime.timezone.utc)
+
+
+class Node:
+    """
+    A compiled (sub-)expression.
+
+    Attributes:
+      rtype: token class of the value of the expression.
+      months: calendar part of the value if rtype is SUNIT, else 0.
+      func: function computing the raw value of the expression from
+        the values of the fields. None if the expression is constant.
+      value: raw value of the expression if it is constant.
+      aware: whether the value has a time zone if rtype is DTIME.
+    """
+    def __init__(self, rtype: Type[tokens.Token], months: int = 0,
+                 func: Optional[Callable[[Env], RawValue]] = None,
+                 value: RawValue = None, aware: bool = False):
+        self.rtype = rtype
+        self.months = months
+        self.func = func
+        self.value = value
+        self.aware = aware
+
+
+class CompiledExpr:
+    """
+    Expression compiled into a function of field values.
+
+    Attributes:
+      rtype: token class of the result (DTIME, SUNIT or BOOL).
+      months: calendar part of the result if rtype is SUNIT, else 0.
+      fields: names of the fields the expression refers to.
+    """
+    def __init__(self, node: Node, fields: Tuple[str, ...]):
+        self.rtype = node.rtype
+        self.months = node.months
+        self.fields = fields
+        if node.func is None:
+            const = node.value
+            self._func: Callable[[Env], RawValue] = lambda env: const
+        else:
+            self._func = node.func
+
+    def __call__(self, env: Optional[Env] = None) -> RawValue:
+        """
+        Evaluate the expression.
+
+        Arguments:
+          env: values of the fields. Must have every field in fields.
+
+        Returns:
+          datetime.datetime, datetime.timedelta (fixed length part of an
+          offset) or bool depending on rtype.
+        """
+        return self._func(env if env is not None else {})
+
+    def token(self, env: Optional[Env] = None) -> dtcalc.lexeval.Value:
+        """
+        Evaluate the expression and wrap the result in a token, like
+        dtcalc.lexeval.eval_postfix() does.
+        """
+        value = self(env)
+        if self.rtype is tokens.SUNIT:
+            return tokens.SUNIT(-1, -1, value, self.months)
+        if self.rtype is tokens.DTIME:
+            return tokens.DTIME(-1, -1, value)
+        return tokens.BOOL(-1, -1, value)
+
+
+def _combine(func: Callable[[RawValue, RawValue], RawValue],
+             fst: Node, snd: Node, rtype: Type[tokens.Token],
+             months: int = 0, aware: bool = False) -> Node:
+    """
+    Make node applying func to the values of two nodes, specialized on
+    which of the two are constant.
+    """
+    ffn, sfn = fst.func, snd.func
+    if ffn is None and sfn is None:
+        try:
+            value = func(fst.value, snd.value)
+        except OverflowError as ovferr:
+            raise ValueError("Result out of range!") from ovferr
+        return Node(rtype, months, value=value, aware=aware)
+    if ffn is None:
+        assert sfn is not None
+        fval, sfunc = fst.value, sfn
+        return Node(rtype, months, lambda env: func(fval, sfunc(env)),
+                    aware=aware)
+    ffunc = ffn
+    if sfn is None:
+        sval = snd.value
+        return Node(rtype, months, lambda env: func(ffunc(env), sval),
+                    aware=aware)
+    sfunc = sfn
+    return Node(rtype, months, lambda env: func(ffunc(env), sfunc(env)),
+                aware=aware)
+
+
+def _constant(value: RawValue) -> Callable[[Env], RawValue]:
+    """
+    Make function of field values always giving value.
+    """
+    return lambda env: value
+
+
+def _shifter(months: int,
+             fixed_op: Callable[[RawValue, RawValue], RawValue]
+             ) -> Callable[[RawValue, RawValue], RawValue]:
+    """
+    Make function applying an offset to a datetime. The calendar part
+    (months) of the offset is applied first like in
+    dtcalc.lexeval.apply_offset().
+    """
+    if months == 0:
+        return fixed_op
+    add_months = dtcalc.civil.add_months
+    return lambda dtval, tdval: fixed_op(add_months(dtval, months), tdval)
+
+
+def _operand(node: Node) -> dtcalc.lexeval.Value:
+    """
+    Make token standing for the value of a node in type checks by
+    dtcalc.lexeval.type_error() and dtcalc.lexeval.func_error(). Those
+    look only at the type, months and time zone of operands.
+    """
+    if node.rtype is tokens.SUNIT:
+        return tokens.SUNIT(-1, -1, datetime.timedelta(0), node.months)
+    if node.rtype is tokens.DTIME:
+        return tokens.DTIME(-1, -1, _AWARE if node.aware else _NAIVE)
+    return tokens.BOOL(-1, -1, False)
+
+
+def _compile_op(oprtr: tokens.OP, fst: Node, snd: Node) -> Node:
+    """
+    Compile an operation whose operands are already compiled.
+
+    Raises:
+      ValueError: when operation is invalid for the operand types.
+    """
+    msg = dtcalc.lexeval.type_error(oprtr, _operand(fst), _operand(snd))
+    if msg is not None:
+        raise ValueError(msg)
+
+    ftype, stype = fst.rtype, snd.rtype
+    if oprtr.value in dtcalc.lexeval.COMPARATORS:
+        return _combine(dtcalc.lexeval.COMPARATORS[oprtr.value], fst, snd,
+                        tokens.BOOL)
+
+    if oprtr.value == "+":
+        if ftype is tokens.DTIME:
+            return _combine(_shifter(snd.months, operator.add), fst, snd,
+                            tokens.DTIME, aware=fst.aware)
+        if stype is tokens.DTIME:
+            # Offset applied to datetime, as in 'D + S'
+            return _combine(_shifter(fst.months, operator.add), snd, fst,
+                            tokens.DTIME, aware=snd.aware)
+        return _combine(operator.add, fst, snd, tokens.SUNIT,
+                        fst.months + snd.months)
+
+    # '-', with the operand types allowed by type_error()
+    if ftype is tokens.DTIME and stype is tokens.DTIME:
+        return _combine(operator.sub, fst, snd, tokens.SUNIT)
+    if ftype is tokens.DTIME:
+        return _combine(_shifter(-snd.months, operator.sub), fst, snd,
+                        tokens.DTIME, aware=fst.aware)
+    return _combine(operator.sub, fst, snd, tokens.SUNIT,
+                    fst.months - snd.months)
+
+
+def _compile_func(func: tokens.FUNC, args: List[Node]) -> Node:
+    """
+    Compile a function call whose arguments are already compiled.
+
+    Raises:
+      ValueError: when args are invalid for func.
+    """
+    msg = dtcalc.lexeval.func_error(func, [_operand(arg) for arg in args])
+    if msg is not None:
+        raise ValueError(msg)
+
+    value = args[0]
+    rounder = dtcalc.lexeval.FUNCTIONS[func.value]
+    round_value = dtcalc.bucket.round_value
+    if all(arg.func is None for arg in args):
+        try:
+            rounded = round_value(rounder, *[arg.value for arg in args])
+        except OverflowError as ovferr:
+            raise ValueError("Result out of range!") from ovferr
+        return Node(value.rtype, value=rounded, aware=value.aware)
+    if value.func is not None and all(arg.func is None for arg in args[1:]):
+        # Usual case of only the value varying, like in floor($ts, 15m)
+        vfn = value.func
+        consts = [arg.value for arg in args[1:]]
+        return Node(value.rtype,
+                    func=lambda env: round_value(rounder, vfn(env), *consts),
+                    aware=value.aware)
+    funcs = [arg.func if arg.func is not None else _constant(arg.value)
+             for arg in args]
+    return Node(value.rtype, func=lambda env: round_value(
+        rounder, *[fn(env) for fn in funcs]), aware=value.aware)
+
+
+def compile_postfix(toks: List[tokens.Token],
+                    aware: bool = False) -> CompiledExpr:
+    """
+    Compile a postfix expression.
+
+    Arguments:
+      toks: a postfix expression of tokens stored as list.
+      aware: whether the values of fields have a time zone, as when
+        read with a format having %z (see dtcalc.dtfmt.has_tz()).
+
+    Returns:
+      Compiled expression.
+
+    Raises:
+      ValueError: when toks is malformed or has invalid operations.
+    """
+    stack: List[Node] = []
+    fields: Dict[str, None] = {}  # ordered set
+    for tok in toks:
+        if isinstance(tok, tokens.DTIME):
+            stack.append(Node(tokens.DTIME, value=tok.value,
+                              aware=dtcalc.lexeval.is_aware(tok.value)))
+        elif isinstance(tok, tokens.SUNIT):
+            stack.append(Node(tokens.SUNIT, tok.months, value=tok.value))
+        elif isinstance(tok, tokens.FIELD):
+            name = tok.value
+            fields[name] = None
+            stack.append(Node(tokens.DTIME, func=operator.itemgetter(name),
+                              aware=aware))
+        elif isinstance(tok, tokens.OP):
+            try:
+                snd = stack.pop()
+                fst = stack.pop()
+            except IndexError as inderr:
+                raise ValueError("Malformed input!") from inderr
+            stack.append(_compile_op(tok, fst, snd))
+        elif isinstance(tok, tokens.FUNC):
+            if (tok.nargs not in dtcalc.lexeval.FUNC_NARGS
+                    or len(stack) < tok.nargs):
+                raise ValueError("Malformed input!")
+            args = stack[-tok.nargs:]
+            del stack[-tok.nargs:]
+            stack.append(_compile_func(tok, args))
+    if len(stack) != 1:
+        raise ValueError("Malformed input!")
+    return CompiledExpr(stack[-1], tuple(fields))
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_expr(inp: str, in_dtfmt: str) -> CompiledExpr:
+    return compile_postfix(dtcalc.lexeval.parse(inp, in_dtfmt),
+                           dtcalc.dtfmt.has_tz(in_dtfmt))
+
+
+def compile_expr(inp: str, in_dtfmt: str) -> CompiledExpr:
+    """
+    Lex, parse and compile an input string.
+
+    Compiled expressions are cached, except those which use 'now' or
+    'today' as their value changes with time.
+
+    Arguments:
+      inp: input string
+      in_dtfmt: input date format
+
+    Returns:
+      Compiled expression.
+
+    Raises:
+      ValueError: when input is malformed or has invalid operations.
+      LexError: when input can't be lexed.
+    """
+    if dtcalc.lexeval.clock_key(inp, datetime.datetime.now()) is not None:
+        return _compile_expr.__wrapped__(inp, in_dtfmt)
+    return _compile_expr(inp, in_dtfmt)
@@ -2,11 +2,14 @@
 Functions to handle different datetime formats.
 """
 
-from typing import Sequence
+from typing import Callable, Optional, Sequence
 import calendar
 import datetime
+import functools
 import re
 
+import dtcalc.civil
+
 
 def list_to_patt(lst: Sequence[str], name: str) -> str:
     """
@@ -124,17 +127,235 @@ def get_pattern(fmt: str) -> re.Pattern:
     return re.compile(out_patt)
 
 
-def fmt_td(tdobj: datetime.timedelta) -> str:
+# Format codes whose values, when zero padded to a fixed width, sort in
+# chronological order. In decreasing order of significance, with widths.
+SORTABLE_CODES = (
+    ('Y', 4), ('m', 2), ('d', 2), ('H', 2), ('M', 2), ('S', 2), ('f', 6)
+)
+
+
+def get_sortable_pattern(fmt: str) -> Optional[re.Pattern]:
+    """
+    Find a pattern matching strings in the given format whose
+    lexicographic order is the same as their chronological order.
+
+    That is possible only if the format codes of fmt are a prefix of
+    SORTABLE_CODES (like in "%Y/%m/%d %H:%M"). Only zero padded values
+    are matched, so that every field has a fixed width.
+
+    Arguments:
+      fmt: format string in the style accepted by date command in POSIX.
+
+    Returns:
+      Compiled pattern if fmt is sortable, else None.
+    """
+    out_patt = ""
+    codes = iter(SORTABLE_CODES)
+    while "%" in fmt:
+        idx = fmt.index("%")
+        out_patt += re.escape(fmt[:idx])
+        code = fmt[idx+1:idx+2]
+        fmt = fmt[idx+2:]
+        if code == "%":
+            out_patt += "%"
+            continue
+        expected, width = next(codes, ("", 0))
+        if code != expected:
+            return None
+        out_patt += rf"\d{{{width}}}"
+    out_patt += re.escape(fmt)
+    return re.compile(out_patt)
+
+
+# Format codes that get_parser() can handle without strptime
+FAST_CODES = frozenset("YymBbdHIpMSfjaA%")
+
+# Characters with special meaning in regex. Literal text of formats is
+# used as such in patterns by get_pattern().
+_REGEX_SPECIAL = frozenset(".^$*+?{}[]\\|()")
+
+_MONTH_NAMES = [name.lower() for name in calendar.month_name]
+_MONTH_ABBRS = [name.lower() for name in calendar.month_abbr]
+_MAX_ORDINAL = datetime.date.max.toordinal()
+
+DateParser = Callable[["re.Match[str]"], Optional[datetime.datetime]]
+
+
+def is_fast_parsable(fmt: str) -> bool:
+    """
+    Check if strings matched by the pattern of a format can be converted
+    to datetime from the match groups alone.
+
+    That needs every format code to be in FAST_CODES and literal text
+    to be free of regex special characters (so that the pattern matches
+    the literal text exactly).
+
+    Arguments:
+      fmt: format string in the style accepted by date command in POSIX.
+    """
+    while "%" in fmt:
+        idx = fmt.index("%")
+        code = fmt[idx+1:idx+2]
+        if _REGEX_SPECIAL.intersection(fmt[:idx]) or code not in FAST_CODES:
+            return False
+        fmt = fmt[idx+2:]
+    return not _REGEX_SPECIAL.intersection(fmt)
+
+
+def has_tz(fmt: str) -> bool:
+    """
+    Check if datetimes read in a format are aware, that is have a time
+    zone. That is the case if fmt has %z.
+
+    Arguments:
+      fmt: format string in the style accepted by date command in POSIX.
+    """
+    while "%" in fmt:
+        idx = fmt.index("%")
+        if fmt[idx+1:idx+2] == "z":
+            return True
+        fmt = fmt[idx+2:]
+    return False
+
+
+def _parse_groups(mobj: "re.Match[str]") -> Optional[datetime.datetime]:
+    """
+    Convert the match of a pattern made by get_pattern() to datetime,
+    doing what datetime.datetime.strptime() does with the values of the
+    format codes.
+
+    Returns:
+      datetime value or None if the values don't make a valid datetime.
+    """
+    # Defaults and order of processing are as in _strptime.py of cpython
+    year: Optional[int] = None
+    month = day = 1
+    hour = minute = second = fraction = 0
+    julian: Optional[int] = None
+    found = mobj.groupdict()
+    for code, text in found.items():
+        if code == 'y':
+            year = int(text)
+            year += 2000 if year <= 68 else 1900
+        elif code == 'Y':
+            year = int(text)
+        elif code == 'm':
+            month = int(text)
+        elif code == 'B':
+            month = _MONTH_NAMES.index(text.lower())
+        elif code == 'b':
+            month = _MONTH_ABBRS.index(text.lower())
+        elif code == 'd':
+            day = int(text)
+        elif code == 'H':
+            hour = int(text)
+        elif code == 'I':
+            hour = int(text)
+            ampm = (found.get('p') or '').lower()
+            if ampm in ('', 'am'):
+                if hour == 12:
+                    hour = 0
+            elif hour != 12:  # pm
+                hour += 12
+        elif code == 'M':
+            minute = int(text)
+        elif code == 'S':
+            second = int(text)
+        elif code == 'f':
+            fraction = int(text.ljust(6, "0"))
+        elif code == 'j':
+            julian = int(text)
+
+    # Feb 29 without a year is worked out in a leap year, but the
+    # result is in year 1900 (and hence invalid)
+    leap_year_fix = year is None and month == 2 and day == 29
+    if year is None:
+        year = 1904 if leap_year_fix else 1900
+    if year < 1:
+        return None
+    if julian is None:
+        if day > dtcalc.civil.month_length(year, month):
+            return None
+    else:
+        # Day of year overrides month and day
+        ordinal = julian - 1 + datetime.date(year, 1, 1).toordinal()
+        if ordinal > _MAX_ORDINAL:
+            return None
+        date = datetime.date.fromordinal(ordinal)
+        year, month, day = date.year, date.month, date.day
+    if leap_year_fix:
+        year = 1900
+        if month == 2 and day == 29:
+            return None
+    if second > 59:
+        return None
+    return datetime.datetime(year, month, day, hour, minute, second,
+                             fraction)
+
+
+@functools.lru_cache(maxsize=64)
+def get_parser(fmt: str) -> DateParser:
+    """
+    Make a function converting matches of the pattern of a format (as
+    made by get_pattern()) to datetime.
+
+    The function doesn't raise exceptions for invalid datetimes. If
+    possible (see is_fast_parsable()), it works on the match groups and
+    doesn't use strptime at all.
+
+    Arguments:
+      fmt: format string in the style accepted by date command in POSIX.
+
+    Returns:
+      Function returning datetime value of a match, or None if matched
+      text isn't a valid datetime.
+    """
+    if is_fast_parsable(fmt):
+        return _parse_groups
+
+    def parse(mobj: "re.Match[str]") -> Optional[datetime.datetime]:
+        try:
+            return datetime.datetime.strptime(mobj["DTIME"], fmt)
+        except ValueError:
+            return None
+    return parse
+
+
+def fmt_td(tdobj: datetime.timedelta, months: int = 0) -> str:
     """
     Format a timedelta object into a string.
-    Use w,d,h,m units.
+    Use w,d,h,m units, preceded by y,mo units for months if any.
+
+    A leading '-' negates the group of units (calendar or fixed) that it
+    precedes.
 
     Arguments:
       tdobj: timedelta object to be formatted into string.
+      months: calendar offset in months.
 
     Returns:
       String representation of tdobj using w,d,h,m units.
     """
+    out_str = ""
+    if months:
+        if months < 0:
+            out_str += "-"
+            months = -months
+        years, months = divmod(months, 12)
+        if years > 0:
+            out_str += f"{years} years, "
+        if months > 0:
+            out_str += f"{months} months, "
+    td_str = _fmt_fixed_td(tdobj)
+    if td_str:
+        out_str += td_str + ", "
+    return out_str[:-2]
+
+
+def _fmt_fixed_td(tdobj: datetime.timedelta) -> str:
+    """
+    Format a timedelta object into a string using w,d,h,m units.
+    """
     # https://gist.github.com/thatalextaylor/7408395
     out_str = ""
     seconds_float = tdobj.total_seconds()
@@ -0,0 +1,54 @@
+"""
+Tally of inputs that failed in a batch.
+"""
+
+from typing import Optional, TextIO
+import collections
+import sys
+
+from dtcalc.lexeval import ErrorRecord
+
+
+class ErrorLog:
+    """
+    Tally of lines that failed in a batch, optionally writing a record
+    of each to a file as tab separated line number, start and end of the
+    offending span, reason code and the line itself.
+
+    Attributes:
+      counts: number of failed lines for each reason code.
+    """
+    def __init__(self, outfile: Optional[TextIO] = None):
+        self.counts: "collections.Counter[str]" = collections.Counter()
+        self._outfile = outfile
+
+    def add(self, lineno: int, line: str, record: ErrorRecord) -> None:
+        """
+        Note failure of a line.
+
+        Arguments:
+          lineno: 1-based line number.
+          line: line without trailing newline.
+          record: reason of failure.
+        """
+        self.counts[record.reason] += 1
+        if self._outfile is not None:
+            self._outfile.write(f"{lineno}\t{record.start}\t{record.end}\t"
+                                f"{record.reason}\t{line}\n")
+
+    def report(self) -> None:
+        """
+        Print number of failed lines by reason to standard error.
+        """
+        total = sum(self.counts.values())
+        if total:
+            details = ", ".join(f"{reason}: {cnt}" for reason, cnt
+                                in sorted(self.counts.items()))
+            print(f"Skipped {total} lines ({details})", file=sys.stderr)
+
+    def close(self) -> None:
+        """
+        Close the file records are written to, if any.
+        """
+        if self._outfile is not None:
+            self._outfile.close()
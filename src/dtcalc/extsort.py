@@ -0,0 +1,260 @@
+"""
+Sort lines by a key computed from their fields, in bounded memory.
+
+Lines are read in batches of at most buffer_lines lines. Each batch is
+sorted in memory and, unless the whole input fits in a single batch,
+written to a file in a temporary directory as a sorted run of records. A
+record is the key packed as a 64-bit integer, the length of the line and
+the line itself. Runs are then merged with heapq.merge(), which holds
+only one record of each run in memory at a time. Runs stay closed until
+they are merged, so the number of open files doesn't grow with input.
+"""
+
+from typing import (Callable, Iterable, Iterator, List, Optional,
+                    Sequence, Tuple, Union)
+import heapq
+import itertools
+import operator
+import os
+import struct
+import tempfile
+
+from dtcalc import tokens
+from dtcalc.bucket import dt_to_us
+from dtcalc.compiler import RawValue
+from dtcalc.lexeval import ErrorRecord
+from dtcalc.linefilter import FieldExpr
+from dtcalc.stats import td_to_us
+
+# Range of keys that can be packed
+KEY_MIN = -2**63
+KEY_MAX = 2**63 - 1
+
+# Most runs merged (and so open) at once. More runs are first merged in
+# groups of this many into longer runs.
+MERGE_WIDTH = 64
+
+# Key and length of line of a record
+_HEADER = struct.Struct("<qI")
+
+# Lines are stored as bytes in runs. Undecodable input survives the round
+# trip as surrogates.
+_ENCODING = "utf-8"
+_ENC_ERRORS = "surrogateescape"
+
+Record = Tuple[int, bytes]
+ErrorHandler = Callable[[int, str, ErrorRecord], None]
+
+_first = operator.itemgetter(0)
+
+
+class SortKey(FieldExpr):
+    """
+    Integer key of input lines, made from an expression like '$ts' or
+    '$2 + 5h' whose value is a datetime or a fixed length offset.
+
+    Key of a datetime is the number of microseconds since 1970-01-01 and
+    that of an offset is its length in microseconds, so that keys
+    compare like the values they are made from.
+    """
+    def __init__(self, expr: str, in_dtfmt: str,
+                 delimiter: Optional[str] = None,
+                 names: Optional[Sequence[str]] = None):
+        """
+        Raises:
+          ValueError: when value of expr isn't a datetime or a fixed
+            length offset, or expr refers to an unknown field.
+          LexError: when expr can't be lexed.
+        """
+        super().__init__(expr, in_dtfmt, delimiter, names)
+        if self.rtype is tokens.DTIME:
+            self._to_key: Callable[[RawValue], int] = dt_to_us
+        elif self.rtype is tokens.SUNIT and not self.months:
+            self._to_key = td_to_us
+        else:
+            raise ValueError("Sort key must be a datetime or a fixed "
+                             "length offset!")
+
+    def key(self, line: str) -> Union[int, ErrorRecord]:
+        """
+        Find the key of a line, without raising exceptions.
+
+        Arguments:
+          line: input line without trailing newline.
+
+        Returns:
+          Key of line, or an ErrorRecord like from evaluate().
+        """
+        value = self.evaluate(line)
+        if isinstance(value, ErrorRecord):
+            return value
+        key = self._to_key(value)
+        if not KEY_MIN <= key <= KEY_MAX:
+            return ErrorRecord(-1, -1, "range")
+        return key
+
+
+def write_run(records: Iterable[Record], path: str) -> None:
+    """
+    Write records to a file.
+
+    Arguments:
+      records: records to be written, already sorted by key.
+      path: path of the file.
+    """
+    with open(path, "wb") as run:
+        pack = _HEADER.pack
+        write = run.write
+        for key, data in records:
+            write(pack(key, len(data)))
+            write(data)
+
+
+def read_run(path: str) -> Iterator[Record]:
+    """
+    Read the records of a file made by write_run(), deleting it at the
+    end. The file is opened only when the first record is asked for.
+    """
+    size = _HEADER.size
+    unpack = _HEADER.unpack
+    with open(path, "rb") as run:
+        read = run.read
+        header = read(size)
+        while header:
+            key, length = unpack(header)
+            yield key, read(length)
+            header = read(size)
+    os.remove(path)
+
+
+class _RunStore:
+    """
+    Temporary directory holding runs, as files that stay closed till
+    they are merged. The directory is removed by cleanup(), or else
+    when the store is garbage collected.
+    """
+    def __init__(self, tmpdir: Optional[str]):
+        self._dir = tempfile.TemporaryDirectory(prefix="dtcalc-sort-",
+                                                dir=tmpdir)
+        self._count = itertools.count()
+
+    def write(self, records: Iterable[Record]) -> str:
+        """
+        Write records as a new run.
+
+        Returns:
+          Path of the run.
+        """
+        path = os.path.join(self._dir.name, f"{next(self._count)}.run")
+        write_run(records, path)
+        return path
+
+    def spill(self, batch: List[Tuple[int, str]]) -> str:
+        """
+        Sort a batch of keys and lines and write it as a new run.
+
+        Returns:
+          Path of the run.
+        """
+        batch.sort(key=_first)
+        return self.write((key, line.encode(_ENCODING, _ENC_ERRORS))
+                          for key, line in batch)
+
+    def cleanup(self) -> None:
+        """
+        Remove the directory and the runs left in it.
+        """
+        self._dir.cleanup()
+
+
+def _merge(runs: List[str]) -> Iterator[Record]:
+    """
+    Merge runs into a single stream of records. Records of equal keys
+    come in the order of runs.
+    """
+    return heapq.merge(*map(read_run, runs), key=_first)
+
+
+def _drain(records: Iterable[Tuple[int, str]],
+           store: _RunStore) -> Iterator[Tuple[int, str]]:
+    """
+    Pass records on, removing the runs once done.
+    """
+    try:
+        yield from records
+    finally:
+        store.cleanup()
+
+
+def _unique(records: Iterable[Tuple[int, str]]) -> Iterator[str]:
+    """
+    Keep only the first line of each key.
+    """
+    last = None
+    for key, line in records:
+        if key != last:
+            last = key
+            yield line
+
+
+def sort_lines(lines: Iterable[str], sort_key: SortKey,
+               buffer_lines: int = 100000, unique: bool = False,
+               tmpdir: Optional[str] = None,
+               on_error: Optional[ErrorHandler] = None) -> Iterator[str]:
+    """
+    Sort lines by their keys, holding at most buffer_lines lines in
+    memory. The sort is stable.
+
+    Arguments:
+      lines: input lines, with or without trailing newline.
+      sort_key: key of lines.
+      buffer_lines: number of lines sorted in memory at a time.
+      unique: keep only the first of lines with equal keys.
+      tmpdir: directory of temporary files. None means the default of
+        tempfile.
+      on_error: function called with the line number, line and
+        ErrorRecord of each line whose key can't be found. Such lines
+        are left out.
+
+    Returns:
+      Iterator over sorted lines, without trailing newline.
+
+    Raises:
+      ValueError: when buffer_lines isn't positive.
+    """
+    if buffer_lines < 1:
+        raise ValueError("Buffer must hold at least one line!")
+
+    store: Optional[_RunStore] = None
+    runs: List[str] = []
+    batch: List[Tuple[int, str]] = []
+    for lineno, line in enumerate(lines, 1):
+        line = line.rstrip("\n")
+        key = sort_key.key(line)
+        if isinstance(key, ErrorRecord):
+            if on_error is not None:
+                on_error(lineno, line, key)
+            continue
+        batch.append((key, line))
+        if len(batch) == buffer_lines:
+            if store is None:
+                store = _RunStore(tmpdir)
+            runs.append(store.spill(batch))
+            batch = []
+
+    records: Iterable[Tuple[int, str]]
+    if store is None:
+        batch.sort(key=_first)
+        records = batch
+    else:
+        if batch:
+            runs.append(store.spill(batch))
+        while len(runs) > MERGE_WIDTH:
+            runs = [store.write(_merge(runs[idx:idx+MERGE_WIDTH]))
+                    for idx in range(0, len(runs), MERGE_WIDTH)]
+        records = _drain(((key, data.decode(_ENCODING, _ENC_ERRORS))
+                          for key, data in _merge(runs)), store)
+
+    if unique:
+        return _unique(records)
+    return (line for _, line in records)
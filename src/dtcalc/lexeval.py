@@ -2,14 +2,59 @@
 Lex and evaluate input.
 """
 
-from typing import Tuple, Union, List, Dict, Optional
+from typing import Tuple, Union, List, Dict, Mapping, Optional, Sequence
 import dataclasses
 import datetime
+import functools
+import itertools
+import operator
 import re
 
 from dtcalc import tokens
+from dtcalc.cache import ResultCache
+import dtcalc.bucket
+import dtcalc.civil
 import dtcalc.dtfmt
 
+# Number of months in each calendar unit
+CALENDAR_UNITS = {"mo": 1, "y": 12}
+
+# Operators binding tighter have higher values
+PRECEDENCE = {
+    "+": 2, "-": 2,
+    "<": 1, "<=": 1, ">": 1, ">=": 1, "==": 1,
+}
+
+COMPARATORS = {
+    "<": operator.lt, "<=": operator.le,
+    ">": operator.gt, ">=": operator.ge,
+    "==": operator.eq,
+}
+
+# Functions, as rounders of dtcalc.bucket, called like
+# 'floor(value, step)' or 'floor(value, step, origin)'
+FUNCTIONS = {
+    "floor": dtcalc.bucket.floor_us,
+    "ceil": dtcalc.bucket.ceil_us,
+}
+FUNC_NARGS = (2, 3)
+
+# Possible values of an expression
+Value = Union[tokens.DTIME, tokens.SUNIT, tokens.BOOL]
+
+
+# Reasons for which evaluation can fail, as used in ErrorRecord
+REASONS = {
+    "lex": "Unrecognized token",
+    "date": "Invalid datetime",
+    "paren": "Unmatched parenthesis",
+    "syntax": "Malformed input",
+    "type": "Invalid operand types",
+    "range": "Value out of range",
+    "field": "Missing or invalid field",
+    "result": "Result of unsuitable type",
+}
+
 
 @dataclasses.dataclass
 class LexError(Exception):
@@ -24,6 +69,37 @@ class LexError(Exception):
     pos: int
 
 
+@dataclasses.dataclass
+class ErrorRecord:
+    """
+    Failure of lexing, parsing or evaluation, returned as a value.
+
+    For batches with many malformed inputs, where raising an exception
+    for each of them would be costly.
+
+    Attributes:
+      start: start index of offending token in input string.
+        -1 if not known.
+      end: one more than the last index of offending token in input
+        string. -1 if not known.
+      reason: reason of failure. One of the keys of REASONS.
+    """
+    start: int
+    end: int
+    reason: str
+
+    def exception(self) -> Exception:
+        """
+        Make the exception to be raised for this failure.
+
+        Returns:
+          LexError for lexing failures, else ValueError.
+        """
+        if self.reason == "lex":
+            return LexError(self.start)
+        return ValueError(f"{REASONS[self.reason]}!")
+
+
 def sunit_to_td(scale: int, unit: str) -> datetime.timedelta:
     """
     Accept an tokens.SUNIT object and calculate equivalent
@@ -52,17 +128,35 @@ def sunit_to_td(scale: int, unit: str) -> datetime.timedelta:
     raise ValueError("Invalid unit!")
 
 
-def next_tok(inp: str, tokpatts, indtfmt: str,
-             pos: int) -> Tuple[tokens.Token, int]:
+def next_tok(inp: str, tokpatts, indtfmt: str, pos: int,
+             now: Optional[datetime.datetime] = None
+             ) -> Tuple[tokens.Token, int]:
     """
     Get next token by matching the regex patterns of the valid tokens.
 
+    'now' and 'today' are resolved using now if it is given, else
+    using the current time.
+
     Returns:
       tokens.Token object corresponding to matched token.
       Index of next character in inp to be processed.
 
     Raises:
       LexError: When next token is invalid.
+      ValueError: When next token is an invalid datetime.
+    """
+    res = match_tok(inp, tokpatts, indtfmt, pos, now)
+    if isinstance(res, ErrorRecord):
+        raise res.exception()
+    return res
+
+
+def match_tok(inp: str, tokpatts, indtfmt: str, pos: int,
+              now: Optional[datetime.datetime] = None
+              ) -> Union[Tuple[tokens.Token, int], ErrorRecord]:
+    """
+    Like next_tok(), but return an ErrorRecord instead of raising an
+    exception when next token is invalid.
     """
     tok: Optional[tokens.Token] = None
     for toktype in tokpatts:
@@ -73,16 +167,26 @@ def next_tok(inp: str, tokpatts, indtfmt: str,
             end = mobj.end()
 
             if toktype == "DTIME":
-                dtval = datetime.datetime.strptime(mobj["DTIME"], indtfmt)
+                dtval = dtcalc.dtfmt.get_parser(indtfmt)(mobj)
+                if dtval is None:
+                    return ErrorRecord(start, end, "date")
                 tok, npos = tokens.DTIME(start, end, dtval), end
             elif toktype == "SUNIT":
                 scale = int(mobj["_SCALE"])
                 unit = mobj["_UNIT"]
-                tdval = sunit_to_td(scale, unit)
-                tok, npos = tokens.SUNIT(start, end, tdval), end
+                if unit in CALENDAR_UNITS:
+                    tok = tokens.SUNIT(start, end, datetime.timedelta(0),
+                                       scale * CALENDAR_UNITS[unit])
+                else:
+                    try:
+                        tdval = sunit_to_td(scale, unit)
+                    except OverflowError:
+                        return ErrorRecord(start, end, "range")
+                    tok = tokens.SUNIT(start, end, tdval)
+                npos = end
             elif toktype == "SPECIAL":
                 valstr = mobj["SPECIAL"]
-                cur_dt = datetime.datetime.now()
+                cur_dt = now if now is not None else datetime.datetime.now()
                 if valstr == "today":
                     tokval = datetime.datetime(cur_dt.year, cur_dt.month,
                                                cur_dt.day)
@@ -90,19 +194,126 @@ def next_tok(inp: str, tokpatts, indtfmt: str,
                 elif valstr == "now":
                     tok = tokens.DTIME(start, end, cur_dt)
                 npos = end
+            elif toktype == "FIELD":
+                tok, npos = tokens.FIELD(start, end, mobj["FIELD"]), end
             elif toktype == "OP":
                 tok, npos = tokens.OP(start, end, mobj["OP"]), end
+            elif toktype == "FUNC":
+                tok, npos = tokens.FUNC(start, end, mobj["FUNC"]), end
+            elif toktype == "COMMA":
+                tok, npos = tokens.COMMA(start, end), end
             elif toktype == "LPAR":
                 tok, npos = tokens.LPAR(start, end), end
             elif toktype == "RPAR":
                 tok, npos = tokens.RPAR(start, end), end
     if tok is None:
-        raise LexError(pos)
+        return ErrorRecord(pos, pos, "lex")
     return tok, npos
 
 
+def apply_offset(dtval: datetime.datetime, offset: tokens.SUNIT,
+                 sign: int) -> datetime.datetime:
+    """
+    Add (sign=1) or subtract (sign=-1) an offset to/from a datetime.
+
+    The calendar part (months) of the offset is applied first, with the
+    day of month clamped to the end of the month. The part with fixed
+    length is applied after that.
+    So 2021/01/31 + 1mo + 1d and 2021/01/31 + (1mo + 1d) are both
+    2021/03/01.
+
+    Raises:
+      ValueError: when result is out of the range of datetime.
+    """
+    dtval = dtcalc.civil.add_months(dtval, sign * offset.months)
+    if sign < 0:
+        return dtval - offset.value
+    return dtval + offset.value
+
+
+def compare(oprtr: tokens.OP, fst: tokens.Token,
+            snd: tokens.Token) -> tokens.BOOL:
+    """
+    Compare two datetimes or two offsets.
+
+    Offsets can be compared only if they have the same number of months.
+
+    Arguments:
+      oprtr: comparison operator
+      fst: first operand
+      snd: second operand
+
+    Returns:
+      Value of 'fst oprtr snd'
+
+    Raises:
+      ValueError: when operands can't be compared.
+    """
+    cmp = COMPARATORS[oprtr.value]
+    if isinstance(fst, tokens.DTIME) and isinstance(snd, tokens.DTIME):
+        return tokens.BOOL(-1, -1, cmp(fst.value, snd.value))
+    if isinstance(fst, tokens.SUNIT) and isinstance(snd, tokens.SUNIT):
+        if fst.months != snd.months:
+            raise ValueError("Can't compare offsets with different months!")
+        return tokens.BOOL(-1, -1, cmp(fst.value, snd.value))
+    raise ValueError("Can only compare two dates or two offsets!")
+
+
+def is_aware(dtobj: datetime.datetime) -> bool:
+    """
+    Check if a datetime has a time zone.
+    """
+    return dtobj.utcoffset() is not None
+
+
+def _tz_error(fst: tokens.DTIME, snd: tokens.DTIME) -> Optional[str]:
+    """
+    Check if two datetimes can be compared or subtracted, which needs
+    both or neither of them to have a time zone.
+    """
+    if is_aware(fst.value) != is_aware(snd.value):
+        return "Can't mix datetimes with and without time zone!"
+    return None
+
+
+def type_error(oprtr: tokens.OP, fst: tokens.Token,
+               snd: tokens.Token) -> Optional[str]:
+    """
+    Check if an operation can be performed on given operands.
+
+    Arguments:
+      oprtr: operator
+      fst: first operand
+      snd: second operand
+
+    Returns:
+      Description of the problem if operation is invalid, else None.
+    """
+    if oprtr.value in COMPARATORS:
+        if isinstance(fst, tokens.DTIME) and isinstance(snd, tokens.DTIME):
+            return _tz_error(fst, snd)
+        if isinstance(fst, tokens.SUNIT) and isinstance(snd, tokens.SUNIT):
+            if fst.months != snd.months:
+                return "Can't compare offsets with different months!"
+            return None
+        return "Can only compare two dates or two offsets!"
+    if oprtr.value not in PRECEDENCE:
+        return f"Unknown operator: {oprtr.value}"
+    if isinstance(fst, tokens.BOOL) or isinstance(snd, tokens.BOOL):
+        return "Can't do arithmetic on comparison results!"
+    if (oprtr.value == "+" and isinstance(fst, tokens.DTIME)
+            and isinstance(snd, tokens.DTIME)):
+        return "Can't add two dates!"
+    if (oprtr.value == "-" and isinstance(fst, tokens.SUNIT)
+            and isinstance(snd, tokens.DTIME)):
+        return "Can't negate a lone datetime!"
+    if isinstance(fst, tokens.DTIME) and isinstance(snd, tokens.DTIME):
+        return _tz_error(fst, snd)
+    return None
+
+
 def evaluate(oprtr: tokens.OP, fst: tokens.Token,
-             snd: tokens.Token) -> Union[tokens.DTIME, tokens.SUNIT]:
+             snd: tokens.Token) -> Value:
     """
     Perform operation using given operator and operands and return result.
     For use during postfix expression evaluation.
@@ -116,48 +327,137 @@ def evaluate(oprtr: tokens.OP, fst: tokens.Token,
       Value of 'fst oprtr snd'
 
     Raises:
-      ValueError: when oprtr is not a valid OP token
+      ValueError: when oprtr is not a valid OP token or can't be used
+        with the operands
     """
-    res: Union[tokens.DTIME, tokens.SUNIT]
+    res: Value
+    msg = type_error(oprtr, fst, snd)
+    if msg is not None:
+        raise ValueError(msg)
     if oprtr.value == "+":
         if isinstance(fst, tokens.DTIME):
-            if isinstance(snd, tokens.DTIME):  # D,D,+
-                raise ValueError("Can't add two dates!")
             if isinstance(snd, tokens.SUNIT):
-                res = tokens.DTIME(-1, -1, fst.value + snd.value)
+                res = tokens.DTIME(-1, -1, apply_offset(fst.value, snd, 1))
         elif isinstance(fst, tokens.SUNIT):
             if isinstance(snd, tokens.DTIME):  # S,D,+
-                res = tokens.DTIME(-1, -1, snd.value + fst.value)
+                res = tokens.DTIME(-1, -1, apply_offset(snd.value, fst, 1))
             elif isinstance(snd, tokens.SUNIT):  # S,S,+
-                res = tokens.SUNIT(-1, -1, fst.value + snd.value)
+                res = tokens.SUNIT(-1, -1, fst.value + snd.value,
+                                   fst.months + snd.months)
     elif oprtr.value == "-":
         if isinstance(fst, tokens.DTIME):
             if isinstance(snd, tokens.DTIME):  # D,D,-
                 res = tokens.SUNIT(-1, -1, fst.value - snd.value)
             elif isinstance(snd, tokens.SUNIT):  # D,S,-
-                res = tokens.DTIME(-1, -1, fst.value - snd.value)
+                res = tokens.DTIME(-1, -1, apply_offset(fst.value, snd, -1))
 
         elif isinstance(fst, tokens.SUNIT):
-            if isinstance(snd, tokens.DTIME):  # S,D,-
-                raise ValueError("Can't negate a lone datetime!")
             if isinstance(snd, tokens.SUNIT):  # S,S,-
-                res = tokens.SUNIT(-1, -1, fst.value - snd.value)
+                res = tokens.SUNIT(-1, -1, fst.value - snd.value,
+                                   fst.months - snd.months)
     else:
-        raise ValueError(f"Unknown operator: {oprtr.value}")
+        res = compare(oprtr, fst, snd)
     return res
 
 
-def lexer(inp: str, tokpatts: Dict[str, re.Pattern],
-          indtfmt: str) -> List[tokens.Token]:
+def func_error(func: tokens.FUNC, args: Sequence[Value]) -> Optional[str]:
+    """
+    Check if a function can be called with given arguments.
+
+    floor and ceil take a datetime or an offset, a step and optionally
+    an origin of the same type as the first argument. Neither the step
+    nor the offsets can have months, as those don't have a fixed length.
+    A datetime and its origin must both have or both lack a time zone.
+
+    Arguments:
+      func: function
+      args: arguments
+
+    Returns:
+      Description of the problem if call is invalid, else None.
+    """
+    if func.value not in FUNCTIONS:
+        return f"Unknown function: {func.value}"
+    if len(args) not in FUNC_NARGS:
+        return f"{func.value}() takes 2 or 3 arguments!"
+    value, step = args[0], args[1]
+    if not isinstance(step, tokens.SUNIT) or step.months:
+        return f"Step of {func.value}() must be a fixed length offset!"
+    if isinstance(value, tokens.SUNIT) and value.months:
+        return f"Can't {func.value}() offsets with months!"
+    if not isinstance(value, (tokens.DTIME, tokens.SUNIT)):
+        return f"Can't {func.value}() comparison results!"
+    if len(args) == 3:
+        origin = args[2]
+        if type(origin) is not type(value) or (
+                isinstance(origin, tokens.SUNIT) and origin.months):
+            return f"Origin of {func.value}() must be like its value!"
+        if isinstance(value, tokens.DTIME) and isinstance(origin,
+                                                          tokens.DTIME):
+            return _tz_error(value, origin)
+    return None
+
+
+def apply_func(func: tokens.FUNC, args: Sequence[Value]) -> Value:
+    """
+    Call a function with given arguments and return result.
+    For use during postfix expression evaluation.
+
+    Arguments:
+      func: function
+      args: arguments, in order.
+
+    Returns:
+      Value of 'func(args)'
+
+    Raises:
+      ValueError: when args are invalid for func or result is out of
+        range.
+    """
+    msg = func_error(func, args)
+    if msg is not None:
+        raise ValueError(msg)
+    value, step = args[0], args[1]
+    origin = args[2].value if len(args) == 3 else None
+    # Ensured by func_error()
+    assert isinstance(value, (tokens.DTIME, tokens.SUNIT))
+    assert isinstance(step, tokens.SUNIT)
+    assert not isinstance(origin, bool)
+    try:
+        val = dtcalc.bucket.round_value(FUNCTIONS[func.value], value.value,
+                                        step.value, origin)
+    except OverflowError as ovferr:
+        raise ValueError("Result out of range!") from ovferr
+    if isinstance(val, datetime.datetime):
+        return tokens.DTIME(-1, -1, val)
+    return tokens.SUNIT(-1, -1, val)
+
+
+def lexer(inp: str, tokpatts: Dict[str, re.Pattern], indtfmt: str,
+          now: Optional[datetime.datetime] = None) -> List[tokens.Token]:
     """
     Perform lexical analysis (tokenization).
     Accept an input string and produce a list of tokens
 
     Arguments:
       inp: input string
+      now: value to be used for 'now' and 'today'. Current time if None.
     Returns:
       List of tokens.Token objects in infix form.
     """
+    res = scan(inp, tokpatts, indtfmt, now)
+    if isinstance(res, ErrorRecord):
+        raise res.exception()
+    return res
+
+
+def scan(inp: str, tokpatts: Dict[str, re.Pattern], indtfmt: str,
+         now: Optional[datetime.datetime] = None
+         ) -> Union[List[tokens.Token], ErrorRecord]:
+    """
+    Like lexer(), but return an ErrorRecord instead of raising an
+    exception on failure.
+    """
     toks = []
     pos = 0
     inplen = len(inp)
@@ -165,7 +465,10 @@ def lexer(inp: str, tokpatts: Dict[str, re.Pattern],
         if inp[pos].isspace():
             pos += 1
         else:
-            tok, pos = next_tok(inp, tokpatts, indtfmt, pos)
+            res = match_tok(inp, tokpatts, indtfmt, pos, now)
+            if isinstance(res, ErrorRecord):
+                return res
+            tok, pos = res
             toks.append(tok)
     return toks
 
@@ -183,70 +486,173 @@ def infix_to_postfix(toks: List[tokens.Token]) -> List[tokens.Token]:
     Returns:
       list of tokens in postfix form.
     """
-    toks.append(tokens.RPAR(-1, -1))
+    res = to_postfix(toks)
+    if isinstance(res, ErrorRecord):
+        raise res.exception()
+    return res
+
+
+def to_postfix(toks: List[tokens.Token]
+               ) -> Union[List[tokens.Token], ErrorRecord]:
+    """
+    Like infix_to_postfix(), but return an ErrorRecord instead of
+    raising an exception on failure.
+    """
+    # Whole input is enclosed in this pair of parentheses
+    outer_lpar = tokens.LPAR(-1, -1)
+    outer_rpar = tokens.RPAR(-1, -1)
 
-    # type is Union[OP, DTIME, SUNIT] actually
+    # type is Union[OP, DTIME, SUNIT, FIELD, FUNC] actually
     post: List[tokens.Token] = []
 
-    stack: List[tokens.Token] = [tokens.LPAR(-1, -1)]
+    stack: List[tokens.Token] = [outer_lpar]
 
-    for tok in toks:
+    # Number of arguments of each function call being parsed, innermost
+    # last. Left parenthesis of a call is just above its FUNC in stack.
+    nargs: List[int] = []
+
+    prev: Optional[tokens.Token] = None
+    for tok in itertools.chain(toks, [outer_rpar]):
         if isinstance(tok, tokens.LPAR):
+            if isinstance(prev, tokens.FUNC):
+                nargs.append(1)
             stack.append(tok)
-        elif isinstance(tok, (tokens.DTIME, tokens.SUNIT)):
+        elif isinstance(tok, (tokens.DTIME, tokens.SUNIT, tokens.FIELD)):
             post.append(tok)
+        elif isinstance(tok, tokens.FUNC):
+            stack.append(tok)
         elif isinstance(tok, tokens.OP):
-            try:
-                # Both operators have same precedence currently
-                while isinstance(stack[-1], tokens.OP):
-                    stok = stack.pop()
-                    post.append(stok)
-                stack.append(tok)
-            except IndexError as inderr:
-                raise ValueError("Malformed input!") from inderr
+            prec = PRECEDENCE[tok.value]
+            # All operators are left associative
+            while (isinstance(stack[-1], tokens.OP)
+                   and PRECEDENCE[stack[-1].value] >= prec):
+                stok = stack.pop()
+                post.append(stok)
+            stack.append(tok)
+        elif isinstance(tok, tokens.COMMA):
+            while not isinstance(stack[-1], tokens.LPAR):
+                stok = stack.pop()
+                post.append(stok)
+            # Commas are allowed only between non-empty arguments
+            if (len(stack) < 2 or not isinstance(stack[-2], tokens.FUNC)
+                    or isinstance(prev, (tokens.LPAR, tokens.COMMA))):
+                return ErrorRecord(tok.start, tok.end, "syntax")
+            nargs[-1] += 1
         # elif isinstance(tok, tokens.RPAR):
         else:
-            try:
-                while not isinstance(stack[-1], tokens.LPAR):
-                    stok = stack.pop()
-                    post.append(stok)
-                stack.pop()  # pop the tokens.LPAR
-            except IndexError as inderr:
-                raise ValueError("Unmatched parenthesis!") from inderr
-    # stack should be empty at this point
-    if stack:
-        raise ValueError("Unmatched parenthesis!")
+            # outer_lpar stays at bottom of stack till outer_rpar
+            while not isinstance(stack[-1], tokens.LPAR):
+                stok = stack.pop()
+                post.append(stok)
+            lpar = stack.pop()
+            if lpar is outer_lpar and tok is not outer_rpar:
+                return ErrorRecord(tok.start, tok.end, "paren")
+            if tok is outer_rpar and lpar is not outer_lpar:
+                return ErrorRecord(lpar.start, lpar.end, "paren")
+            if stack and isinstance(stack[-1], tokens.FUNC):
+                if isinstance(prev, (tokens.LPAR, tokens.COMMA)):
+                    return ErrorRecord(tok.start, tok.end, "syntax")
+                func = stack.pop()
+                assert isinstance(func, tokens.FUNC)
+                post.append(dataclasses.replace(func, nargs=nargs.pop()))
+        prev = tok
     return post
 
 
-def eval_postfix(toks: List[tokens.Token]) -> Union[tokens.DTIME,
-                                                    tokens.SUNIT]:
+def eval_postfix(toks: List[tokens.Token],
+                 fields: Optional[Mapping[str, datetime.datetime]] = None
+                 ) -> Value:
     """
     Evaluate using a stack a list of tokens arranged in postfix
     notation order.
 
     Arguments:
       toks: a postfix expression of tokens stored as list.
+      fields: values of the fields referred to in toks.
 
     Returns:
       Value of the postfix expression after evaluation.
+
+    Raises:
+      ValueError: when toks is malformed or a field has no value.
+    """
+    res = try_eval_postfix(toks, fields)
+    if isinstance(res, ErrorRecord):
+        raise res.exception()
+    return res
+
+
+def try_eval_postfix(toks: List[tokens.Token],
+                     fields: Optional[Mapping[str, datetime.datetime]] = None
+                     ) -> Union[Value, ErrorRecord]:
+    """
+    Like eval_postfix(), but return an ErrorRecord instead of raising
+    an exception on failure.
     """
     # stack consists only of value in postfix evaluation
-    stack: List[Union[tokens.DTIME, tokens.SUNIT]] = []
+    stack: List[Value] = []
     for tok in toks:
         if isinstance(tok, (tokens.SUNIT, tokens.DTIME)):
             stack.append(tok)
+        elif isinstance(tok, tokens.FIELD):
+            if fields is None or tok.value not in fields:
+                return ErrorRecord(tok.start, tok.end, "field")
+            stack.append(tokens.DTIME(tok.start, tok.end,
+                                      fields[tok.value]))
         elif isinstance(tok, tokens.OP):
+            if len(stack) < 2:
+                return ErrorRecord(tok.start, tok.end, "syntax")
             snd = stack.pop()
             fst = stack.pop()
-            val = evaluate(tok, fst, snd)
+            if type_error(tok, fst, snd) is not None:
+                return ErrorRecord(tok.start, tok.end, "type")
+            try:
+                val = evaluate(tok, fst, snd)
+            except (ValueError, OverflowError):
+                return ErrorRecord(tok.start, tok.end, "range")
+            stack.append(val)
+        elif isinstance(tok, tokens.FUNC):
+            if tok.nargs not in FUNC_NARGS or len(stack) < tok.nargs:
+                return ErrorRecord(tok.start, tok.end, "syntax")
+            args = stack[-tok.nargs:]
+            del stack[-tok.nargs:]
+            if func_error(tok, args) is not None:
+                return ErrorRecord(tok.start, tok.end, "type")
+            try:
+                val = apply_func(tok, args)
+            except ValueError:
+                return ErrorRecord(tok.start, tok.end, "range")
             stack.append(val)
     if len(stack) != 1:
-        raise ValueError("Malformed input!")
+        if stack:
+            return ErrorRecord(stack[-1].start, stack[-1].end, "syntax")
+        return ErrorRecord(-1, -1, "syntax")
     return stack[-1]
 
 
-def lexeval(inp_lst: List[str], in_dtfmt: str, out_dtfmt: str) -> str:
+def clock_key(inp: str,
+              now: datetime.datetime) -> Optional[datetime.datetime]:
+    """
+    Find the part of the current time that the value of an input depends
+    on, so that it can be made part of a cache key.
+
+    Arguments:
+      inp: input string
+      now: current time
+
+    Returns:
+      now if inp mentions 'now', the date of now if inp mentions only
+      'today', else None.
+    """
+    if "now" in inp:
+        return now
+    if "today" in inp:
+        return datetime.datetime(now.year, now.month, now.day)
+    return None
+
+
+def lexeval(inp_lst: List[str], in_dtfmt: str, out_dtfmt: str,
+            cache: Optional[ResultCache] = None) -> str:
     """
     Driver function for performing input evaluation.
 
@@ -254,28 +660,125 @@ def lexeval(inp_lst: List[str], in_dtfmt: str, out_dtfmt: str) -> str:
       inp: input string
       in_dtfmt: input date format
       out_dtfmt: output date format
+      cache: cache to look up and store results in. Not used if None,
+        or if inp uses 'now'.
 
     Returns:
       String representation of resultant datetime or timedelta
     """
+    inp = ' '.join(inp_lst)
+    if cache is None or "now" in inp:
+        # Value of 'now' differs on every call, so caching its result
+        # would only push other entries out
+        return _lexeval(inp, in_dtfmt, out_dtfmt, None)
+
+    # Sample the clock once so that the key and the value agree on it
+    now = datetime.datetime.now()
+    key = (inp, in_dtfmt, out_dtfmt, clock_key(inp, now))
+    res_str = cache.get(key)
+    if res_str is None:
+        res_str = _lexeval(inp, in_dtfmt, out_dtfmt, now)
+        cache.put(key, res_str)
+    return res_str
+
+
+def _lexeval(inp: str, in_dtfmt: str, out_dtfmt: str,
+             now: Optional[datetime.datetime]) -> str:
+    """
+    Evaluate input string without involving any cache.
+    """
+    result = compute(inp, in_dtfmt, now)
+    if isinstance(result, tokens.DTIME):
+        res_str = result.value.strftime(out_dtfmt)
+    elif isinstance(result, tokens.BOOL):
+        res_str = str(result.value)
+    # elif isinstance(result, tokens.SUNIT):
+    else:
+        res_str = dtcalc.dtfmt.fmt_td(result.value, result.months)
+    return res_str
+
+
+def get_tokpatts(in_dtfmt: str) -> Dict[str, re.Pattern]:
+    """
+    Make the regex patterns of the valid tokens.
+
+    Arguments:
+      in_dtfmt: input date format
 
-    tokpatts = {
+    Returns:
+      Dictionary mapping token type to the pattern matching it.
+    """
+    return {
         # No conflicts as of now. So order shouldn't matter
         "LPAR": re.compile(r' *(?P<LPAR>\()'),
         "RPAR": re.compile(r' *(?P<RPAR>\))'),
-        "OP": re.compile(r' *(?P<OP>\+|-)'),
-        "SUNIT": re.compile(r' *(?P<SUNIT>(?P<_SCALE>\d+)(?P<_UNIT>w|d|h|m))'),
+        "OP": re.compile(r' *(?P<OP>\+|-|<=|>=|==|<|>)'),
+        "SUNIT": re.compile(r' *(?P<SUNIT>(?P<_SCALE>\d+)'
+                            r'(?P<_UNIT>mo|y|w|d|h|m))'),
         "SPECIAL": re.compile(r' *(?P<SPECIAL>today|now)'),
+        "FUNC": re.compile(r' *(?P<FUNC>floor|ceil)(?= *\()'),
+        "COMMA": re.compile(r' *(?P<COMMA>,)'),
+        "FIELD": re.compile(r' *\$(?P<FIELD>\w+)'),
         "DTIME": dtcalc.dtfmt.get_pattern(in_dtfmt),
     }
 
-    inp = ' '.join(inp_lst)
-    infix_toks = lexer(inp, tokpatts, in_dtfmt)
-    postfix_toks = infix_to_postfix(infix_toks)
-    result = eval_postfix(postfix_toks)
-    if isinstance(result, tokens.DTIME):
-        res_str = result.value.strftime(out_dtfmt)
-    # elif isinstance(result, tokens.SUNIT):
-    else:
-        res_str = dtcalc.dtfmt.fmt_td(result.value)
-    return res_str
+
+@functools.lru_cache(maxsize=16)
+def _tokpatts(in_dtfmt: str) -> Dict[str, re.Pattern]:
+    """
+    Cached get_tokpatts(). Returned value is shared and must not be
+    modified.
+    """
+    return get_tokpatts(in_dtfmt)
+
+
+def parse(inp: str, in_dtfmt: str,
+          now: Optional[datetime.datetime] = None) -> List[tokens.Token]:
+    """
+    Lex input string and arrange the tokens in postfix form.
+
+    Arguments:
+      inp: input string
+      in_dtfmt: input date format
+      now: value to be used for 'now' and 'today'. Current time if None.
+
+    Returns:
+      list of tokens in postfix form.
+    """
+    infix_toks = lexer(inp, _tokpatts(in_dtfmt), in_dtfmt, now)
+    return infix_to_postfix(infix_toks)
+
+
+def compute(inp: str, in_dtfmt: str,
+            now: Optional[datetime.datetime] = None) -> Value:
+    """
+    Evaluate input string and return the result without formatting it.
+
+    Arguments:
+      inp: input string
+      in_dtfmt: input date format
+      now: value to be used for 'now' and 'today'. Current time if None.
+
+    Returns:
+      Resultant DTIME, SUNIT or BOOL token.
+    """
+    res = try_compute(inp, in_dtfmt, now)
+    if isinstance(res, ErrorRecord):
+        raise res.exception()
+    return res
+
+
+def try_compute(inp: str, in_dtfmt: str,
+                now: Optional[datetime.datetime] = None
+                ) -> Union[Value, ErrorRecord]:
+    """
+    Like compute(), but return an ErrorRecord instead of raising an
+    exception on failure.
+    """
+    infix_toks = scan(inp, _tokpatts(in_dtfmt), in_dtfmt, now)
+    if isinstance(infix_toks, ErrorRecord):
+        return infix_toks
+    postfix_toks = to_postfix(infix_toks)
+    if isinstance(postfix_toks, ErrorRecord):
+        return postfix_toks
+    return try_eval_postfix(postfix_toks)
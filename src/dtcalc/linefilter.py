@@ -0,0 +1,250 @@
+"""
+Evaluate expressions over the fields of input lines, and select lines
+using a comparison over their fields.
+"""
+
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+import datetime
+
+from dtcalc import tokens
+from dtcalc.compiler import RawValue
+from dtcalc.lexeval import ErrorRecord
+import dtcalc.compiler
+import dtcalc.dtfmt
+import dtcalc.lexeval
+
+
+class FieldExpr:
+    """
+    Expression over the fields of input lines, like '$2 - $1' or
+    '$ts + 3d', evaluated for one line at a time.
+
+    Fields are referred to as $N (1-based field number, $0 being the
+    whole line) or as $name if names are given.
+
+    Lines are split only as far as the last field referred to and only
+    the referred fields are parsed, lazily, stopping at the first one
+    that doesn't hold a datetime.
+
+    Attributes:
+      delimiter: field separator. None means runs of white space.
+      rtype: token class of the value of the expression.
+      months: calendar part of the value if rtype is SUNIT, else 0.
+    """
+    def __init__(self, expr: str, in_dtfmt: str,
+                 delimiter: Optional[str] = None,
+                 names: Optional[Sequence[str]] = None):
+        """
+        Raises:
+          ValueError: when expr is malformed or refers to an unknown
+            field.
+          LexError: when expr can't be lexed.
+        """
+        self.delimiter = delimiter
+        self._in_dtfmt = in_dtfmt
+        self._postfix = dtcalc.lexeval.parse(expr, in_dtfmt)
+        self._compiled = dtcalc.compiler.compile_postfix(
+            self._postfix, dtcalc.dtfmt.has_tz(in_dtfmt))
+        self.rtype = self._compiled.rtype
+        self.months = self._compiled.months
+
+        # Field name to index of field in line (-1 for whole line), in
+        # the order in which they are needed during evaluation
+        self._fields: Dict[str, int] = {
+            name: field_index(name, names)
+            for name in self._compiled.fields
+        }
+        self._maxsplit = max(self._fields.values(), default=-1) + 1
+
+        # Field name to its first reference in expr, for error records
+        self._spans: Dict[str, Tuple[int, int]] = {}
+        for tok in reversed(self._postfix):
+            if isinstance(tok, tokens.FIELD):
+                self._spans[tok.value] = (tok.start, tok.end)
+
+        self._dtpatt = dtcalc.dtfmt.get_pattern(in_dtfmt)
+        self._parser = dtcalc.dtfmt.get_parser(in_dtfmt)
+
+    @staticmethod
+    def _field_text(parts: List[str], line: str,
+                    idx: int) -> Optional[str]:
+        """
+        Find the text of a field, without surrounding white space.
+
+        Returns:
+          Text of field or None if line has no such field.
+        """
+        if idx < 0:
+            return line.strip()
+        if idx < len(parts):
+            return parts[idx].strip()
+        return None
+
+    def _split(self, line: str) -> List[str]:
+        """
+        Split line as far as needed for the fields referred to.
+        """
+        if self._maxsplit > 0:
+            return line.split(self.delimiter, self._maxsplit)
+        return []
+
+    def _evaluate(self, parts: List[str],
+                  line: str) -> Union[RawValue, ErrorRecord]:
+        """
+        Evaluate the expression for a line already split by _split().
+        """
+        values = {}
+        for name, idx in self._fields.items():
+            text = self._field_text(parts, line, idx)
+            # Cheap check before the costlier conversion
+            mobj = self._dtpatt.fullmatch(text) if text is not None else None
+            if mobj is None:
+                return ErrorRecord(*self._spans[name], "field")
+            dtval = self._parser(mobj)
+            if dtval is None:
+                return ErrorRecord(*self._spans[name], "date")
+            values[name] = dtval
+        try:
+            return self._compiled(values)
+        except (ValueError, OverflowError):
+            # Like when adding an offset takes value out of range
+            return ErrorRecord(-1, -1, "range")
+
+    def evaluate(self, line: str) -> Union[RawValue, ErrorRecord]:
+        """
+        Evaluate the expression for a line, without raising exceptions.
+
+        Arguments:
+          line: input line without trailing newline.
+
+        Returns:
+          Raw value of the expression (see
+          dtcalc.compiler.CompiledExpr), or an ErrorRecord if a field is
+          missing or doesn't hold a valid datetime. Span of the record
+          is that of the reference to the field in the expression.
+        """
+        return self._evaluate(self._split(line), line)
+
+
+class LineFilter(FieldExpr):
+    """
+    Predicate on input lines, made from a comparison expression like
+    '$ts > 2021/06/01' or '$2 - $1 > 3d'.
+
+    If the expression is a comparison of a field with a datetime and the
+    input format sorts chronologically (like '%Y/%m/%d'), the field is
+    first compared as string so that most rejected lines are never
+    parsed.
+    """
+    def __init__(self, expr: str, in_dtfmt: str,
+                 delimiter: Optional[str] = None,
+                 names: Optional[Sequence[str]] = None):
+        """
+        Raises:
+          ValueError: when expr isn't a comparison or refers to an
+            unknown field.
+          LexError: when expr can't be lexed.
+        """
+        super().__init__(expr, in_dtfmt, delimiter, names)
+        if self.rtype is not tokens.BOOL:
+            raise ValueError("Filter expression must be a comparison!")
+        self._prefilter = self._make_prefilter()
+
+    def _make_prefilter(self) -> Optional[Tuple[int, Callable[[str], bool]]]:
+        """
+        Make a check on the string value of a field that is necessary
+        for the comparison to hold, if there can be one.
+
+        Returns:
+          Index of the field and the check, or None.
+        """
+        sortable = dtcalc.dtfmt.get_sortable_pattern(self._in_dtfmt)
+        if sortable is None or len(self._postfix) != 3:
+            return None
+        fst, snd, oprtr = self._postfix
+        if isinstance(fst, tokens.FIELD) and isinstance(snd, tokens.DTIME):
+            field, const = fst, snd
+        elif isinstance(fst, tokens.DTIME) and isinstance(snd, tokens.FIELD):
+            field, const = snd, fst
+        else:
+            return None
+        const_str = const.value.strftime(self._in_dtfmt)
+        if not sortable.fullmatch(const_str):
+            return None
+        # Constants finer than the format (like 'now') would be rounded
+        # down by strftime(), making the string comparison wrong
+        if datetime.datetime.strptime(const_str,
+                                      self._in_dtfmt) != const.value:
+            return None
+
+        assert isinstance(oprtr, tokens.OP)
+        cmp = dtcalc.lexeval.COMPARATORS[oprtr.value]
+        field_first = field is fst
+
+        def check(text: str) -> bool:
+            # Values not zero padded can't be compared this way
+            if sortable.fullmatch(text) is None:
+                return True
+            if field_first:
+                return cmp(text, const_str)
+            return cmp(const_str, text)
+        return self._fields[field.value], check
+
+    def check(self, line: str) -> Union[bool, ErrorRecord]:
+        """
+        Check if a line satisfies the comparison, without raising
+        exceptions.
+
+        Lines rejected by the string comparison are not checked for
+        errors.
+
+        Arguments:
+          line: input line without trailing newline.
+
+        Returns:
+          Whether the comparison holds, or an ErrorRecord like from
+          evaluate().
+        """
+        parts = self._split(line)
+        if self._prefilter is not None:
+            idx, check = self._prefilter
+            text = self._field_text(parts, line, idx)
+            if text is not None and not check(text):
+                return False
+        return self._evaluate(parts, line)
+
+    def __call__(self, line: str) -> bool:
+        """
+        Check if a line satisfies the comparison.
+
+        Lines which lack a field or whose fields don't hold valid
+        datetimes are rejected.
+
+        Arguments:
+          line: input line without trailing newline.
+
+        Returns:
+          True if line is to be selected.
+        """
+        return self.check(line) is True
+
+
+def field_index(name: str, names: Optional[Sequence[str]]) -> int:
+    """
+    Find the index of a field in a line.
+
+    Arguments:
+      name: field name or 1-based field number.
+      names: field names, in order. None if fields have no names.
+
+    Returns:
+      0-based index of field, or -1 for the whole line ($0).
+
+    Raises:
+      ValueError: when there is no such field.
+    """
+    if name.isdigit():
+        return int(name) - 1
+    if names is not None and name in names:
+        return list(names).index(name)
+    raise ValueError(f"Unknown field: ${name}")
@@ -0,0 +1,264 @@
+"""
+Streaming aggregate statistics over durations.
+"""
+
+from typing import Dict, List, Tuple
+import datetime
+import math
+
+import dtcalc.dtfmt
+
+# Lower bounds (in microseconds) of the histogram bins, one for each unit
+# used by dtcalc.dtfmt.fmt_td()
+HIST_BINS = (
+    ("weeks", 604800_000000),  # 60*60*24*7 seconds
+    ("days", 86400_000000),  # 60*60*24 seconds
+    ("hours", 3600_000000),  # 60*60 seconds
+    ("minutes", 60_000000),
+)
+
+
+def td_to_us(tdobj: datetime.timedelta) -> int:
+    """
+    Convert a timedelta object to an integer number of microseconds
+    without going through floats.
+
+    Arguments:
+      tdobj: timedelta object to be converted.
+
+    Returns:
+      Number of microseconds in tdobj.
+    """
+    return ((tdobj.days * 86400 + tdobj.seconds) * 1000000
+            + tdobj.microseconds)
+
+
+def hist_label(usecs: int) -> str:
+    """
+    Find the histogram bin of a duration.
+
+    Arguments:
+      usecs: duration in microseconds.
+
+    Returns:
+      Label of the bin to which usecs belongs.
+    """
+    for unit, lower in HIST_BINS:
+        if usecs >= lower:
+            return f">= 1 {unit}"
+        if usecs <= -lower:
+            return f"<= -1 {unit}"
+    return "< 1 minutes"
+
+
+class DurationStats:
+    """
+    Summary of a stream of durations computed in a single pass.
+
+    Count, sum, minimum and maximum are exact. Percentiles are
+    approximated with a sketch of logarithmically sized buckets (as in
+    DDSketch) whose values are within a relative error of rel_acc.
+    The value given for a bucket is kept within the smallest and largest
+    durations put in it, so it is exact if they are all the same.
+    Memory used depends only on rel_acc and the range of the values, not
+    on their number.
+
+    Two summaries made with the same rel_acc can be combined with
+    merge(), so that chunks of input can be processed separately.
+
+    Attributes:
+      rel_acc: relative accuracy of percentiles.
+      count: number of durations seen.
+      total: sum of the durations seen, in microseconds.
+      min: smallest duration seen, in microseconds.
+      max: largest duration seen, in microseconds.
+      hist: number of durations in each bin of HIST_BINS.
+    """
+    def __init__(self, rel_acc: float = 0.01):
+        if not 0 < rel_acc < 1:
+            raise ValueError("Relative accuracy must be between 0 and 1!")
+        self.rel_acc = rel_acc
+        self._gamma = (1 + rel_acc) / (1 - rel_acc)
+        self._log_gamma = math.log(self._gamma)
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+        self.hist: Dict[str, int] = {}
+
+        # Bucket index to count, smallest and largest magnitude in
+        # bucket, for positive and negative values
+        self._pos: Dict[int, List[int]] = {}
+        self._neg: Dict[int, List[int]] = {}
+        self._zero = 0
+
+    def add(self, tdobj: datetime.timedelta) -> None:
+        """
+        Add a duration to the summary.
+
+        Arguments:
+          tdobj: duration to be added.
+        """
+        usecs = td_to_us(tdobj)
+        if self.count == 0:
+            self.min = self.max = usecs
+        elif usecs < self.min:
+            self.min = usecs
+        elif usecs > self.max:
+            self.max = usecs
+        self.count += 1
+        self.total += usecs
+
+        if usecs > 0:
+            self._add_to_bucket(self._pos, usecs)
+        elif usecs < 0:
+            self._add_to_bucket(self._neg, -usecs)
+        else:
+            self._zero += 1
+
+        label = hist_label(usecs)
+        self.hist[label] = self.hist.get(label, 0) + 1
+
+    def _add_to_bucket(self, buckets: Dict[int, List[int]],
+                       mag: int) -> None:
+        """
+        Add the magnitude of a non-zero duration to its bucket.
+        """
+        idx = math.ceil(math.log(mag) / self._log_gamma)
+        bucket = buckets.get(idx)
+        if bucket is None:
+            buckets[idx] = [1, mag, mag]
+        else:
+            bucket[0] += 1
+            if mag < bucket[1]:
+                bucket[1] = mag
+            elif mag > bucket[2]:
+                bucket[2] = mag
+
+    def merge(self, other: "DurationStats") -> None:
+        """
+        Fold another summary into this one.
+
+        Arguments:
+          other: summary to be merged. Must have the same rel_acc.
+
+        Raises:
+          ValueError: when relative accuracies differ.
+        """
+        if other.rel_acc != self.rel_acc:
+            raise ValueError("Can't merge summaries of different accuracy!")
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.min, self.max = other.min, other.max
+        else:
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+        self._zero += other._zero
+        for mine, theirs in ((self._pos, other._pos),
+                             (self._neg, other._neg)):
+            for idx, (cnt, low, high) in theirs.items():
+                bucket = mine.get(idx)
+                if bucket is None:
+                    mine[idx] = [cnt, low, high]
+                else:
+                    bucket[0] += cnt
+                    bucket[1] = min(bucket[1], low)
+                    bucket[2] = max(bucket[2], high)
+        for label, cnt in other.hist.items():
+            self.hist[label] = self.hist.get(label, 0) + cnt
+
+    def mean(self) -> datetime.timedelta:
+        """
+        Find the arithmetic mean of the durations seen.
+
+        Raises:
+          ValueError: when no durations were seen.
+        """
+        if self.count == 0:
+            raise ValueError("No durations to summarize!")
+        return datetime.timedelta(microseconds=self.total / self.count)
+
+    def quantile(self, qval: float) -> datetime.timedelta:
+        """
+        Find an approximate quantile of the durations seen.
+
+        Arguments:
+          qval: quantile to be found. Between 0 and 1 (both inclusive).
+
+        Returns:
+          Approximate duration of rank ceil(qval * count) (1-based)
+          among the durations seen, as in the nearest-rank method. So
+          the 0 and 1 quantiles are the minimum and maximum.
+
+        Raises:
+          ValueError: when qval is out of range or no durations were seen.
+        """
+        if not 0 <= qval <= 1:
+            raise ValueError("Quantile must be between 0 and 1!")
+        if self.count == 0:
+            raise ValueError("No durations to summarize!")
+
+        rank = max(math.ceil(qval * self.count), 1)
+        seen = 0
+        usecs = 0.0
+        # Smallest to largest: negative buckets by decreasing magnitude,
+        # zero, then positive buckets by increasing magnitude
+        buckets: List[Tuple[float, int]] = [
+            (-self._bucket_value(idx, self._neg[idx]), self._neg[idx][0])
+            for idx in sorted(self._neg, reverse=True)
+        ]
+        buckets.append((0.0, self._zero))
+        buckets.extend((self._bucket_value(idx, self._pos[idx]),
+                        self._pos[idx][0])
+                       for idx in sorted(self._pos))
+        for usecs, cnt in buckets:
+            seen += cnt
+            if seen >= rank:
+                break
+        usecs = min(max(usecs, self.min), self.max)
+        return datetime.timedelta(microseconds=usecs)
+
+    def _bucket_value(self, idx: int, bucket: List[int]) -> float:
+        """
+        Representative magnitude of a bucket, with minimal relative
+        error for every value in it, moved within the range of the
+        magnitudes actually put in it.
+        """
+        value = 2 * self._gamma ** idx / (self._gamma + 1)
+        return min(max(value, bucket[1]), bucket[2])
+
+    def histogram(self) -> List[Tuple[str, int]]:
+        """
+        Counts of durations in each bin, ordered from the most negative
+        bin to the most positive one. Empty bins are left out.
+        """
+        labels = [f"<= -1 {unit}" for unit, _ in HIST_BINS]
+        labels.append("< 1 minutes")
+        labels.extend(f">= 1 {unit}" for unit, _ in reversed(HIST_BINS))
+        return [(label, self.hist[label])
+                for label in labels if label in self.hist]
+
+    def summary(self) -> str:
+        """
+        Describe the summary in the units used by dtcalc.dtfmt.fmt_td().
+
+        Raises:
+          ValueError: when no durations were seen.
+        """
+        def fmt(tdobj: datetime.timedelta) -> str:
+            return dtcalc.dtfmt.fmt_td(tdobj) or "0 minutes"
+
+        lines = [
+            f"count: {self.count}",
+            f"min: {fmt(datetime.timedelta(microseconds=self.min))}",
+            f"max: {fmt(datetime.timedelta(microseconds=self.max))}",
+            f"mean: {fmt(self.mean())}",
+        ]
+        for pct in (50, 90, 99):
+            lines.append(f"p{pct}: {fmt(self.quantile(pct / 100))}")
+        lines.append("histogram:")
+        lines.extend(f"  {label}: {cnt}" for label, cnt in self.histogram())
+        return "\n".join(lines)
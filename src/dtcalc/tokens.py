@@ -30,10 +30,16 @@ class SUNIT(Token):
     Results from combination of an integer ('scale') and a 'unit'.
     Value would end up being a datetime.timedelta.
 
+    Calendar units (months and years) don't have a fixed length and are
+    kept separately as a number of months.
+    When applied to a datetime, months are applied first and then value.
+
     Attributes:
-      value: resultant datetime offset.
+      value: resultant datetime offset of fixed length.
+      months: resultant calendar offset in months.
     """
     value: datetime.timedelta
+    months: int = 0
 
 
 @dataclasses.dataclass
@@ -47,6 +53,29 @@ class DTIME(Token):
     value: datetime.datetime
 
 
+@dataclasses.dataclass
+class BOOL(Token):
+    """
+    Represents result of a comparison.
+
+    Attributes:
+      value: truth value
+    """
+    value: bool
+
+
+@dataclasses.dataclass
+class FIELD(Token):
+    """
+    Represents a reference to a field of an input line, whose datetime
+    value is known only while evaluating that line.
+
+    Attributes:
+      value: field name or 1-based field number, as string.
+    """
+    value: str
+
+
 @dataclasses.dataclass
 class OP(Token):
     """
@@ -58,6 +87,27 @@ class OP(Token):
     value: str
 
 
+@dataclasses.dataclass
+class FUNC(Token):
+    """
+    Represents a function, like floor or ceil.
+
+    Attributes:
+      value: function name.
+      nargs: number of arguments it is called with. Known only after
+        parsing; 0 till then.
+    """
+    value: str
+    nargs: int = 0
+
+
+@dataclasses.dataclass
+class COMMA(Token):
+    """
+    Represents comma separating arguments of a function.
+    """
+
+
 @dataclasses.dataclass
 class LPAR(Token):
     """
@@ -0,0 +1,94 @@
+import datetime
+
+import pytest
+
+from dtcalc.bucket import (floor_us, ceil_us, dt_to_us, us_to_dt,
+                           round_value)
+
+HOUR = 3600_000000
+IST = datetime.timezone(datetime.timedelta(hours=5, minutes=30))
+
+
+@pytest.mark.parametrize("usecs,step,origin,floor,ceil", [
+    (0, 10, 0, 0, 0),
+    (7, 10, 0, 0, 10),
+    (-7, 10, 0, -10, 0),
+    (17, 10, 5, 15, 25),
+    (5, 10, 5, 5, 5),
+    (-6, 10, -1, -11, -1),
+    (3 * HOUR + 1, HOUR, 0, 3 * HOUR, 4 * HOUR),
+])
+def test_floor_ceil(usecs, step, origin, floor, ceil):
+    assert floor_us(usecs, step, origin) == floor
+    assert ceil_us(usecs, step, origin) == ceil
+
+
+@pytest.mark.parametrize("dtobj,usecs", [
+    (datetime.datetime(1970, 1, 1), 0),
+    (datetime.datetime(1970, 1, 1, 0, 0, 0, 1), 1),
+    (datetime.datetime(1969, 12, 31, 23), -HOUR),
+    (datetime.datetime(2021, 6, 1), 1622505600_000000),
+])
+def test_dt_to_us(dtobj, usecs):
+    assert dt_to_us(dtobj) == usecs
+    assert us_to_dt(usecs) == dtobj
+
+
+def test_aware():
+    dtobj = datetime.datetime(1970, 1, 1, 5, 30, tzinfo=IST)
+    assert dt_to_us(dtobj) == 0
+    assert us_to_dt(0, IST) == dtobj
+    assert us_to_dt(0, IST).tzinfo is IST
+    # Near the ends of datetime range, where astimezone() would fail
+    dtobj = datetime.datetime(1, 1, 1, tzinfo=IST)
+    assert us_to_dt(dt_to_us(dtobj), IST) == dtobj
+
+
+@pytest.mark.parametrize("rounder,value,step,origin,expected", [
+    (floor_us, datetime.datetime(2021, 6, 1, 10, 37),
+     datetime.timedelta(minutes=15), None,
+     datetime.datetime(2021, 6, 1, 10, 30)),
+    (ceil_us, datetime.datetime(2021, 6, 1, 10, 37),
+     datetime.timedelta(days=1), datetime.datetime(2021, 1, 1, 6),
+     datetime.datetime(2021, 6, 2, 6)),
+    (floor_us, datetime.timedelta(minutes=-1), datetime.timedelta(hours=1),
+     None, datetime.timedelta(hours=-1)),
+    # Aware datetimes are rounded in UTC, keeping their time zone
+    (floor_us, datetime.datetime(2021, 6, 1, 10, 37, tzinfo=IST),
+     datetime.timedelta(hours=1), None,
+     datetime.datetime(2021, 6, 1, 10, 30, tzinfo=IST)),
+    (floor_us, datetime.datetime(2021, 6, 1, 10, 37, tzinfo=IST),
+     datetime.timedelta(days=1),
+     datetime.datetime(2021, 1, 1, tzinfo=IST),
+     datetime.datetime(2021, 6, 1, tzinfo=IST)),
+])
+def test_round_value(rounder, value, step, origin, expected):
+    rounded = round_value(rounder, value, step, origin)
+    assert rounded == expected
+    assert getattr(rounded, "tzinfo", None) is getattr(value, "tzinfo", None)
+
+
+@pytest.mark.parametrize("step,exctype", [
+    (datetime.timedelta(0), ValueError),
+    (datetime.timedelta(days=-1), ValueError),
+    (datetime.timedelta(weeks=1), OverflowError),
+])
+def test_round_value_invalid(step, exctype):
+    with pytest.raises(exctype):
+        round_value(ceil_us, datetime.datetime(9999, 12, 31), step)
+
+
+def test_numpy():
+    numpy = pytest.importorskip("numpy")
+    dtobjs = [datetime.datetime(2021, 6, 1, 10, 37),
+              datetime.datetime(1969, 12, 31, 23, 59, 59, 999999),
+              datetime.datetime(2000, 2, 29, 12)]
+    usecs = numpy.array(dtobjs, dtype="datetime64[us]").astype(numpy.int64)
+    assert list(usecs) == [dt_to_us(dtobj) for dtobj in dtobjs]
+
+    step, origin = 15 * 60_000000, dt_to_us(datetime.datetime(2021, 1, 4))
+    for rounder in (floor_us, ceil_us):
+        res = rounder(usecs, step, origin)
+        assert res.dtype == numpy.int64
+        assert list(res) == [rounder(int(val), step, origin)
+                             for val in usecs]
@@ -0,0 +1,70 @@
+import datetime
+
+import pytest
+
+from dtcalc.civil import (is_leap, month_length, days_from_civil,
+                          civil_from_days, shift_days, add_months)
+
+EPOCH = datetime.date(1970, 1, 1)
+
+
+@pytest.mark.parametrize("year,expected", [
+    (2021, False), (2024, True), (1900, False), (2000, True),
+])
+def test_is_leap(year, expected):
+    assert is_leap(year) == expected
+
+
+@pytest.mark.parametrize("year,month,expected", [
+    (2021, 2, 28), (2024, 2, 29), (2021, 4, 30), (2021, 12, 31),
+])
+def test_month_length(year, month, expected):
+    assert month_length(year, month) == expected
+
+
+@pytest.mark.parametrize("date", [
+    datetime.date(1970, 1, 1), datetime.date(1969, 12, 31),
+    datetime.date(2000, 2, 29), datetime.date(2000, 3, 1),
+    datetime.date(1, 1, 1), datetime.date(9999, 12, 31),
+    datetime.date(2021, 11, 14),
+])
+def test_days_civil_roundtrip(date):
+    days = (date - EPOCH).days
+    assert days_from_civil(date.year, date.month, date.day) == days
+    assert civil_from_days(days) == (date.year, date.month, date.day)
+
+
+def test_days_civil_exhaustive():
+    date = datetime.date(1896, 1, 1)
+    days = (date - EPOCH).days
+    while date.year < 2104:
+        assert civil_from_days(days) == (date.year, date.month, date.day)
+        date += datetime.timedelta(days=1)
+        days += 1
+
+
+@pytest.mark.parametrize("dtobj,months,expected", [
+    (datetime.datetime(2021, 1, 31, 10, 30), 1,
+     datetime.datetime(2021, 2, 28, 10, 30)),
+    (datetime.datetime(2024, 1, 31), 1, datetime.datetime(2024, 2, 29)),
+    (datetime.datetime(2021, 3, 31), -1, datetime.datetime(2021, 2, 28)),
+    (datetime.datetime(2021, 11, 14), 18, datetime.datetime(2023, 5, 14)),
+    (datetime.datetime(2021, 1, 14), -13, datetime.datetime(2019, 12, 14)),
+    (datetime.datetime(2024, 2, 29), 12, datetime.datetime(2025, 2, 28)),
+    (datetime.datetime(2021, 1, 14), 0, datetime.datetime(2021, 1, 14)),
+    (datetime.datetime(1969, 12, 31, 23, 59, 59, 999999), -2,
+     datetime.datetime(1969, 10, 31, 23, 59, 59, 999999)),
+])
+def test_add_months(dtobj, months, expected):
+    assert add_months(dtobj, months) == expected
+    days = (dtobj.date() - EPOCH).days
+    assert shift_days(days, months) == (expected.date() - EPOCH).days
+
+
+@pytest.mark.parametrize("dtobj,months", [
+    (datetime.datetime(9999, 12, 1), 1),
+    (datetime.datetime(1, 1, 31, 12), -1),
+])
+def test_add_months_out_of_range(dtobj, months):
+    with pytest.raises(ValueError):
+        add_months(dtobj, months)
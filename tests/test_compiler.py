@@ -0,0 +1,139 @@
+import datetime
+
+import pytest
+
+from dtcalc.compiler import compile_expr, compile_postfix
+from dtcalc.lexeval import (eval_postfix, try_eval_postfix, parse,
+                            ErrorRecord, LexError)
+import dtcalc.tokens as tokens
+
+FIELDS = {
+    "ts": datetime.datetime(2021, 1, 31, 10, 30),
+    "start": datetime.datetime(2020, 12, 25),
+}
+
+
+@pytest.mark.parametrize("inp", [
+    "2021/11/09 + 2d",
+    "2d + 2021/11/09 - 1w",
+    "2021/11/09 - 2021/10/01",
+    "1y + 2mo - 3d",
+    "$ts + 1mo",
+    "1mo + $ts",
+    "$ts - (1mo + 1d)",
+    "$ts - $start",
+    "$ts - $start + 1y",
+    "$ts - $start > 3d",
+    "$ts <= $start + 5w",
+    "$ts == $ts",
+    "2021/11/09 < 2021/11/10",
+    "1y == 12mo",
+    "floor($ts, 1h)",
+    "ceil($ts - 3d, 1w, $start)",
+    "floor($ts - $start, 1d, 12h) > 5w",
+    "floor($ts, $ts - $start)",
+    "ceil(2021/11/09 - 1m, 1d)",
+])
+def test_same_as_interpreter(inp):
+    postfix = parse(inp, "%Y/%m/%d")
+    compiled = compile_postfix(postfix)
+    assert compiled.token(FIELDS) == eval_postfix(postfix, FIELDS)
+
+
+@pytest.mark.parametrize("inp", [
+    "floor($ts, 1h)",
+    "ceil($ts, 1d, $start)",
+    "floor($ts, 1d, 2021/01/01+0530)",
+    "floor($ts - 1mo, 1h) - $start",
+])
+def test_aware(inp):
+    tzinfo = datetime.timezone(datetime.timedelta(hours=5, minutes=30))
+    fields = {name: value.replace(tzinfo=tzinfo)
+              for name, value in FIELDS.items()}
+    postfix = parse(inp, "%Y/%m/%d%z")
+    compiled = compile_postfix(postfix, aware=True)
+    assert compiled.token(fields) == eval_postfix(postfix, fields)
+    if compiled.rtype is tokens.DTIME:
+        assert compiled(fields).tzinfo is tzinfo
+
+
+@pytest.mark.parametrize("inp,rtype,months,fields", [
+    ("$ts + 1mo", tokens.DTIME, 0, ("ts",)),
+    ("$ts - $start + 1y", tokens.SUNIT, 12, ("ts", "start")),
+    ("$ts - $start > 3d", tokens.BOOL, 0, ("ts", "start")),
+    ("2d - 1y", tokens.SUNIT, -12, ()),
+])
+def test_types(inp, rtype, months, fields):
+    compiled = compile_expr(inp, "%Y/%m/%d")
+    assert compiled.rtype is rtype
+    assert compiled.months == months
+    assert compiled.fields == fields
+
+
+def test_raw_value():
+    compiled = compile_expr("$ts + 1mo", "%Y/%m/%d")
+    assert compiled(FIELDS) == datetime.datetime(2021, 2, 28, 10, 30)
+    assert compile_expr("2d + 1d", "%Y/%m/%d")() == datetime.timedelta(3)
+
+
+def test_cached():
+    assert (compile_expr("$ts + 3d", "%Y/%m/%d")
+            is compile_expr("$ts + 3d", "%Y/%m/%d"))
+    assert (compile_expr("now + 3d", "%Y/%m/%d")
+            is not compile_expr("now + 3d", "%Y/%m/%d"))
+
+
+@pytest.mark.parametrize("inp", [
+    "$ts + $start",
+    "2d - $ts",
+    "$ts < 3d",
+    "1mo < 30d",
+    "($ts < $start) + 2d",
+    "$ts < $start < $ts",
+    "2d 3d",
+    "9999/12/31 + 1d",
+    "$ts < 0001/01/01 - 1d",
+    "floor($ts, 1mo)",
+    "floor($ts, 1d, 1d)",
+    "floor($ts < $start, 1d)",
+    "ceil(9999/12/31, 1w)",
+])
+def test_invalid(inp):
+    with pytest.raises(ValueError):
+        compile_expr(inp, "%Y/%m/%d")
+
+
+@pytest.mark.parametrize("inp", [
+    "$ts > today",
+    "now - $ts",
+    "floor($ts, 1d, today)",
+    "floor(today, 1d, $ts)",
+])
+def test_invalid_aware(inp):
+    with pytest.raises(ValueError):
+        compile_expr(inp, "%Y/%m/%d%z")
+
+
+@pytest.mark.parametrize("inp", [
+    "$ts + $start",
+    "2d - $ts",
+    "$ts < 3d",
+    "1mo < 30d",
+    "($ts < $start) + 2d",
+    "$ts < $start < $ts",
+    "floor($ts, 1mo)",
+    "floor(1mo, 1d)",
+    "floor($ts, 1d, 1d)",
+    "floor($ts < $start, 1d)",
+])
+def test_type_error_as_interpreter(inp):
+    postfix = parse(inp, "%Y/%m/%d")
+    result = try_eval_postfix(postfix, FIELDS)
+    assert isinstance(result, ErrorRecord) and result.reason == "type"
+    with pytest.raises(ValueError):
+        compile_postfix(postfix)
+
+
+def test_lexerror():
+    with pytest.raises(LexError):
+        compile_expr("2d + abc", "%Y/%m/%d")
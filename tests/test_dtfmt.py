@@ -34,6 +34,77 @@ class TestGetPattern:
             dtcalc.dtfmt.get_pattern(fmt)
 
 
+class TestGetSortablePattern:
+    @pytest.mark.parametrize("fmt,expected", [
+        ("%Y/%m/%d", re.compile(r"\d{4}/\d{2}/\d{2}")),
+        ("%Y%m%d %H:%M %%", re.compile(r"\d{4}\d{2}\d{2}\ \d{2}:\d{2}\ %")),
+        ("%Y.%m", re.compile(r"\d{4}\.\d{2}")),
+    ])
+    def test_sortable(self, fmt, expected):
+        assert dtcalc.dtfmt.get_sortable_pattern(fmt) == expected
+
+    @pytest.mark.parametrize("fmt", [
+        "%d/%m/%Y", "%Y/%d", "%Y/%m/%d %I:%M", "%Y/%m/%", "%m",
+    ])
+    def test_unsortable(self, fmt):
+        assert dtcalc.dtfmt.get_sortable_pattern(fmt) is None
+
+
+@pytest.mark.parametrize("fmt,expected", [
+    ("%Y/%m/%d %H:%M:%S,%f", True),
+    ("%d %B %Y, %I %p", True),
+    ("%j %y %a %A %b %%", True),
+    ("%Y.%m.%d", False),
+    ("%Y/%m/%d%z", False),
+    ("%Y %U %w", False),
+    ("%Y %", False),
+])
+def test_is_fast_parsable(fmt, expected):
+    assert dtcalc.dtfmt.is_fast_parsable(fmt) == expected
+
+
+@pytest.mark.parametrize("fmt,expected", [
+    ("%Y/%m/%d%z", True),
+    ("%H:%M %z %Y", True),
+    ("%Y/%m/%d %Z", False),
+    ("%Y/%m/%d %%z", False),
+    ("%Y/%m/%d", False),
+])
+def test_has_tz(fmt, expected):
+    assert dtcalc.dtfmt.has_tz(fmt) == expected
+
+
+class TestGetParser:
+    @pytest.mark.parametrize("fmt,text", [
+        ("%Y/%m/%d", "2021/11/14"),
+        ("%Y/%m/%d", "2024/2/29"),
+        ("%Y/%m/%d %H:%M:%S.%f", "2021/11/14 23:05:09.12"),
+        ("%d %B %Y, %I %p", " 4 July 2021, 12 AM"),
+        ("%d %b %y %I:%M %p", "04 Jul 69 12:30 pm"),
+        ("%I:%M", "12:30"),
+        ("%Y %j", "2021 366"),
+        ("%Y %m %d %j", "2021 02 30 032"),
+        ("%m %d %j", "02 29 001"),
+        ("%Y.%m.%d", "2021.11.14"),
+    ])
+    def test_same_as_strptime(self, fmt, text):
+        mobj = dtcalc.dtfmt.get_pattern(fmt).fullmatch(text)
+        parse = dtcalc.dtfmt.get_parser(fmt)
+        assert parse(mobj) == datetime.datetime.strptime(mobj["DTIME"], fmt)
+
+    @pytest.mark.parametrize("fmt,text", [
+        ("%Y/%m/%d", "2021/02/29"),
+        ("%Y/%m/%d", "0000/01/01"),
+        ("%Y/%m/%d %H:%M:%S", "2021/11/14 10:00:60"),
+        ("%m/%d", "02/29"),
+        ("%Y %j", "9999 366"),
+        ("%Y.%m.%d", "2021x11x14"),
+    ])
+    def test_invalid(self, fmt, text):
+        mobj = dtcalc.dtfmt.get_pattern(fmt).fullmatch(text)
+        assert dtcalc.dtfmt.get_parser(fmt)(mobj) is None
+
+
 @pytest.mark.parametrize("tdobj,expected", [
     (datetime.timedelta(days=1), "1 days"),
     (datetime.timedelta(days=-1), "-1 days"),
@@ -42,3 +113,13 @@ class TestGetPattern:
 ])
 def test_fmt_td(tdobj, expected):
     assert dtcalc.dtfmt.fmt_td(tdobj) == expected
+
+
+@pytest.mark.parametrize("tdobj,months,expected", [
+    (datetime.timedelta(0), 18, "1 years, 6 months"),
+    (datetime.timedelta(0), -12, "-1 years"),
+    (datetime.timedelta(days=3), 2, "2 months, 3 days"),
+    (datetime.timedelta(days=-3), 2, "2 months, -3 days"),
+])
+def test_fmt_td_months(tdobj, months, expected):
+    assert dtcalc.dtfmt.fmt_td(tdobj, months) == expected
@@ -0,0 +1,31 @@
+import io
+
+from dtcalc.errlog import ErrorLog
+from dtcalc.lexeval import ErrorRecord
+
+
+def test_records():
+    outfile = io.StringIO()
+    errlog = ErrorLog(outfile)
+    errlog.add(3, "2021/02/30 - 1d", ErrorRecord(0, 10, "date"))
+    errlog.add(7, "x\ty", ErrorRecord(-1, -1, "result"))
+    assert outfile.getvalue() == ("3\t0\t10\tdate\t2021/02/30 - 1d\n"
+                                  "7\t-1\t-1\tresult\tx\ty\n")
+    assert errlog.counts == {"date": 1, "result": 1}
+    errlog.close()
+    assert outfile.closed
+
+
+def test_report(capsys):
+    errlog = ErrorLog()
+    for lineno, reason in enumerate(["lex", "date", "lex"], 1):
+        errlog.add(lineno, "", ErrorRecord(0, 0, reason))
+    errlog.report()
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert captured.err == "Skipped 3 lines (date: 1, lex: 2)\n"
+
+
+def test_report_nothing(capsys):
+    ErrorLog().report()
+    assert capsys.readouterr() == ("", "")
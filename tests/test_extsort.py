@@ -0,0 +1,127 @@
+import datetime
+import os
+import random
+
+import pytest
+
+from dtcalc.extsort import SortKey, sort_lines, read_run, write_run
+from dtcalc.lexeval import ErrorRecord, LexError
+import dtcalc.extsort
+
+FMT = "%Y/%m/%d %H:%M"
+
+LINES = [
+    "b,2021/06/02 10:00",
+    "a,2021/06/01 10:00",
+    "c,bad",
+    "d,2021/06/01 10:00",
+    "e,2021/05/30 23:00",
+]
+
+
+@pytest.mark.parametrize("expr,line,in_dtfmt,expected", [
+    ("$2", "x,1970/01/01 00:01", FMT, 60_000000),
+    ("$2", "x,1969/12/31 23:59", FMT, -60_000000),
+    ("$2 + 1h", "x,1970/01/01 00:00", FMT, 3600_000000),
+    ("$2 - 1970/01/02 00:00", "x,1970/01/01 00:00", FMT, -86400_000000),
+    ("$2", "x,2021/13/01 00:00", FMT, ErrorRecord(0, 2, "field")),
+    ("$2", "x,2021/02/30 00:00", FMT, ErrorRecord(0, 2, "date")),
+    ("$2", "x", FMT, ErrorRecord(0, 2, "field")),
+    ("$2 + 1h", "x,9999/12/31 23:30", FMT, ErrorRecord(-1, -1, "range")),
+    # Aware datetimes are counted from 1970/01/01 UTC
+    ("$2", "x,1970/01/01 05:30+0530", "%Y/%m/%d %H:%M%z", 0),
+    ("$2 - 1h", "x,1970/01/01 00:00-0100", "%Y/%m/%d %H:%M%z", 0),
+    ("$2", "x,0001/01/01 00:00+0100", "%Y/%m/%d %H:%M%z",
+     -62135600400_000000),
+])
+def test_key(expr, line, in_dtfmt, expected):
+    sort_key = SortKey(expr, in_dtfmt, ",")
+    assert sort_key.key(line) == expected
+
+
+@pytest.mark.parametrize("expr", [
+    "$2 > 2021/01/01 00:00",
+    "$2 - 2021/01/01 00:00 + 1mo",
+    "$ts",
+])
+def test_invalid_key(expr):
+    with pytest.raises(ValueError):
+        SortKey(expr, "%Y/%m/%d %H:%M", ",")
+
+
+def test_lexerror():
+    with pytest.raises(LexError):
+        SortKey("$2 + abc", "%Y/%m/%d %H:%M", ",")
+
+
+@pytest.mark.parametrize("buffer_lines", [1, 2, 3, 100])
+@pytest.mark.parametrize("unique,expected", [
+    (False, ["e", "a", "d", "b"]),
+    (True, ["e", "a", "b"]),
+])
+def test_sort_lines(buffer_lines, unique, expected):
+    sort_key = SortKey("$2", "%Y/%m/%d %H:%M", ",")
+    errors = []
+    res = sort_lines((line + "\n" for line in LINES), sort_key,
+                     buffer_lines, unique,
+                     on_error=lambda *args: errors.append(args))
+    assert [line[0] for line in res] == expected
+    assert errors == [(3, "c,bad", ErrorRecord(0, 2, "field"))]
+
+
+def test_sort_lines_many_runs(monkeypatch, tmp_path):
+    monkeypatch.setattr(dtcalc.extsort, "MERGE_WIDTH", 3)
+    rng = random.Random(0)
+    start = datetime.datetime(2021, 1, 1)
+    lines = []
+    for idx in range(500):
+        dtobj = start + datetime.timedelta(minutes=rng.randrange(300))
+        lines.append(f"{idx},{dtobj:%Y/%m/%d %H:%M},é")
+    sort_key = SortKey("$2", "%Y/%m/%d %H:%M", ",")
+    expected = sorted(lines, key=lambda line: line.split(",")[1])
+    assert list(sort_lines(lines, sort_key, 7,
+                           tmpdir=str(tmp_path))) == expected
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_buffer_lines():
+    sort_key = SortKey("$2", "%Y/%m/%d %H:%M", ",")
+    with pytest.raises(ValueError):
+        sort_lines(LINES, sort_key, 0)
+
+
+def test_run_roundtrip(tmp_path):
+    records = [(-2**63, b""), (0, b"a\xff"), (2**63 - 1, b"b" * 1000)]
+    path = str(tmp_path / "run")
+    write_run(records, path)
+    assert list(read_run(path)) == records
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_open_files(monkeypatch, tmp_path):
+    resource = pytest.importorskip("resource")
+    monkeypatch.setattr(dtcalc.extsort, "MERGE_WIDTH", 8)
+    lines = [f"{idx},2021/06/01 {idx % 24:02}:{idx % 60:02}"
+             for idx in range(300)]
+    sort_key = SortKey("$2", "%Y/%m/%d %H:%M", ",")
+    expected = sorted(lines, key=lambda line: line.split(",")[1])
+
+    # Far fewer open files than the 300 runs made
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    in_use = len(os.listdir("/dev/fd"))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (in_use + 20, hard))
+    try:
+        res = list(sort_lines(lines, sort_key, 1, tmpdir=str(tmp_path)))
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+    assert res == expected
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cleanup_unfinished(tmp_path):
+    sort_key = SortKey("$2", "%Y/%m/%d %H:%M", ",")
+    res = sort_lines(LINES, sort_key, 1, tmpdir=str(tmp_path))
+    assert list(tmp_path.iterdir()) != []
+    next(res)
+    res.close()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,441 @@
+"""
+Differential tests checking the fast paths of dtcalc against a reference
+built only from datetime.datetime.strptime() and datetime arithmetic.
+
+Inputs are generated randomly from fixed seeds so that failures can be
+reproduced.
+"""
+
+import calendar
+import datetime
+import operator
+import random
+import time
+
+import pytest
+
+from dtcalc.cache import ResultCache
+from dtcalc.compiler import compile_postfix
+from dtcalc.lexeval import (eval_postfix, compute, try_compute, parse,
+                            lexeval, ErrorRecord, LexError)
+from dtcalc.linefilter import LineFilter
+import dtcalc.civil
+import dtcalc.dtfmt
+
+SEEDS = range(5)
+
+SEPARATORS = ["/", "-", " ", ":", ",", ".", "", "T"]
+
+# Formats usable in expressions (no clash with operators or units)
+EXPR_FORMATS = [
+    "%Y/%m/%d", "%Y/%m/%d %H:%M", "%d.%m.%Y", "%b %d %Y", "%Y-%m-%d",
+    "%Y/%j",
+]
+
+UNITS = {
+    "w": datetime.timedelta(weeks=1),
+    "d": datetime.timedelta(days=1),
+    "h": datetime.timedelta(hours=1),
+    "m": datetime.timedelta(minutes=1),
+}
+
+COMPARATORS = {
+    "<": operator.lt, "<=": operator.le,
+    ">": operator.gt, ">=": operator.ge,
+    "==": operator.eq,
+}
+
+ERROR = "error"
+
+
+def random_datetime(rng):
+    if rng.random() < 0.05:
+        year = rng.choice([1, 2, 9998, 9999])
+    else:
+        year = rng.randint(1900, 2100)
+    start = datetime.datetime(year, 1, 1)
+    return start + datetime.timedelta(seconds=rng.randrange(365 * 86400),
+                                      microseconds=rng.randrange(10**6))
+
+
+def random_format(rng):
+    codes = rng.sample(sorted(dtcalc.dtfmt.PATT_DICT), rng.randint(1, 5))
+    fmt = ""
+    for code in codes:
+        fmt += f"%{code}" + rng.choice(SEPARATORS)
+    return fmt
+
+
+def mutate(rng, text):
+    """
+    Replace a random digit of text, to make invalid values.
+    """
+    digits = [idx for idx, char in enumerate(text) if char.isdigit()]
+    if not digits:
+        return text
+    idx = rng.choice(digits)
+    return text[:idx] + str(rng.randrange(10)) + text[idx+1:]
+
+
+def ref_strptime(text, fmt):
+    try:
+        return datetime.datetime.strptime(text, fmt)
+    except ValueError:
+        return None
+
+
+class TestDateParser:
+    @pytest.mark.parametrize("seed", SEEDS)
+    def test_same_as_strptime(self, seed):
+        rng = random.Random(seed)
+        checked = 0
+        for _ in range(400):
+            fmt = random_format(rng)
+            try:
+                patt = dtcalc.dtfmt.get_pattern(fmt)
+            except ValueError:
+                continue
+            parse_match = dtcalc.dtfmt.get_parser(fmt)
+            text = random_datetime(rng).strftime(fmt)
+            for cand in (text, mutate(rng, text), mutate(rng, text)):
+                mobj = patt.fullmatch(cand)
+                if mobj is None:
+                    continue
+                assert (parse_match(mobj)
+                        == ref_strptime(mobj["DTIME"], fmt)), (fmt, cand)
+                checked += 1
+        assert checked > 100
+
+
+def ref_add_months(dtobj, months):
+    """
+    Move a datetime by months one month at a time.
+    """
+    step = 1 if months > 0 else -1
+    year, month = dtobj.year, dtobj.month
+    for _ in range(abs(months)):
+        month += step
+        if month == 13:
+            year, month = year + 1, 1
+        elif month == 0:
+            year, month = year - 1, 12
+    day = min(dtobj.day, calendar.monthrange(year, month)[1])
+    return dtobj.replace(year=year, month=month, day=day)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_civil_same_as_reference(seed):
+    rng = random.Random(seed)
+    epoch = datetime.datetime(1970, 1, 1)
+    for _ in range(500):
+        dtobj = random_datetime(rng)
+        dtobj = dtobj.replace(year=rng.randint(1800, 2200),
+                              day=min(dtobj.day, 28))
+        months = rng.randint(-240, 240)
+        expected = ref_add_months(dtobj, months)
+        assert dtcalc.civil.add_months(dtobj, months) == expected
+        days = (dtobj - epoch).days
+        assert (dtcalc.civil.shift_days(days, months)
+                == (expected.date() - epoch.date()).days)
+
+
+class Leaf:
+    def __init__(self, text, value):
+        self.text = text
+        self.value = value  # datetime, timedelta or None if invalid
+
+
+class Expr:
+    def __init__(self, oprtr, fst, snd, paren):
+        self.oprtr = oprtr
+        self.fst = fst
+        self.snd = snd
+        self.paren = paren
+        snd_text = snd.text
+        if isinstance(snd, Expr) and not snd.paren:
+            # So that tree matches left to right evaluation order
+            snd_text = f"({snd_text})"
+        self.text = f"{fst.text} {oprtr} {snd_text}"
+        if paren:
+            self.text = f"({self.text})"
+
+
+def random_leaf(rng, fmt, fields):
+    if rng.random() < 0.5:
+        scale = rng.randint(0, 500)
+        unit = rng.choice(sorted(UNITS))
+        return Leaf(f"{scale}{unit}", scale * UNITS[unit])
+    dtobj = random_datetime(rng)
+    text = dtobj.strftime(fmt)
+    if rng.random() < 0.1:
+        text = mutate(rng, text)
+    if fields is not None and rng.random() < 0.5:
+        fields.append(text)
+        return Leaf(f"${len(fields)}", ref_strptime(text, fmt))
+    return Leaf(text, ref_strptime(text, fmt))
+
+
+def random_expr(rng, fmt, depth, fields=None):
+    """
+    Make a random expression of depth at most depth. Comparisons appear
+    only at the top.
+    """
+    if depth == 0 or rng.random() < 0.3:
+        return random_leaf(rng, fmt, fields)
+    oprtr = rng.choice(["+", "-"])
+    fst = random_expr(rng, fmt, depth - 1, fields)
+    snd = random_expr(rng, fmt, depth - 1, fields)
+    return Expr(oprtr, fst, snd, rng.random() < 0.3)
+
+
+def ref_eval(expr):
+    """
+    Evaluate expression tree with datetime arithmetic.
+
+    Returns:
+      Raw value or ERROR.
+    """
+    if isinstance(expr, Leaf):
+        return ERROR if expr.value is None else expr.value
+    fst = ref_eval(expr.fst)
+    snd = ref_eval(expr.snd)
+    if ERROR in (fst, snd):
+        return ERROR
+    ftd = isinstance(fst, datetime.timedelta)
+    std = isinstance(snd, datetime.timedelta)
+    try:
+        if expr.oprtr in COMPARATORS:
+            if ftd != std or isinstance(fst, bool) or isinstance(snd, bool):
+                return ERROR
+            return COMPARATORS[expr.oprtr](fst, snd)
+        if isinstance(fst, bool) or isinstance(snd, bool):
+            return ERROR
+        if expr.oprtr == "+":
+            return ERROR if not (ftd or std) else fst + snd
+        return ERROR if ftd and not std else fst - snd
+    except OverflowError:
+        return ERROR
+
+
+def raw(result):
+    """
+    Raw value of a result token, or ERROR.
+    """
+    if isinstance(result, ErrorRecord):
+        return ERROR
+    assert not getattr(result, "months", 0)
+    return result.value
+
+
+def run_compiled(postfix, fields=None):
+    try:
+        return raw(compile_postfix(postfix).token(fields))
+    except (ValueError, OverflowError):
+        return ERROR
+
+
+def run_interpreter(postfix, fields=None):
+    try:
+        return raw(eval_postfix(postfix, fields))
+    except ValueError:
+        return ERROR
+
+
+def make_cases(seed, count=200):
+    rng = random.Random(seed)
+    cases = []
+    for _ in range(count):
+        fmt = rng.choice(EXPR_FORMATS)
+        expr = random_expr(rng, fmt, 3)
+        if rng.random() < 0.3:
+            expr = Expr(rng.choice(sorted(COMPARATORS)), expr,
+                        random_expr(rng, fmt, 2), False)
+        cases.append((fmt, expr))
+    return cases
+
+
+class TestEngine:
+    @pytest.mark.parametrize("seed", SEEDS)
+    def test_same_as_reference(self, seed):
+        cache = ResultCache(64)
+        for fmt, expr in make_cases(seed):
+            expected = ref_eval(expr)
+            got = raw(try_compute(expr.text, fmt))
+            assert got == expected, (fmt, expr.text)
+
+            try:
+                res = compute(expr.text, fmt)
+                assert res.value == expected, (fmt, expr.text)
+            except (ValueError, LexError):
+                assert expected == ERROR, (fmt, expr.text)
+
+            try:
+                postfix = parse(expr.text, fmt)
+            except (ValueError, LexError):
+                continue
+            assert run_interpreter(postfix) == expected, (fmt, expr.text)
+            assert run_compiled(postfix) == expected, (fmt, expr.text)
+
+            if expected != ERROR:
+                plain = lexeval([expr.text], fmt, "%Y/%m/%d %H:%M")
+                assert lexeval([expr.text], fmt, "%Y/%m/%d %H:%M",
+                               cache) == plain
+
+    @pytest.mark.parametrize("seed", SEEDS)
+    def test_fields_same_as_reference(self, seed):
+        rng = random.Random(seed)
+        for _ in range(200):
+            fmt = rng.choice(["%Y/%m/%d", "%Y/%m/%d %H:%M"])
+            fields = []
+            expr = random_expr(rng, fmt, 3, fields)
+            expr = Expr(rng.choice(sorted(COMPARATORS)), expr,
+                        random_expr(rng, fmt, 1, fields), False)
+            expected = ref_eval(expr)
+            line = "\t".join(fields)
+            env = {str(idx): ref_strptime(text, fmt)
+                   for idx, text in enumerate(fields, 1)}
+
+            try:
+                line_filter = LineFilter(expr.text, fmt, "\t")
+            except (ValueError, LexError):
+                # Type errors and invalid constants are found before
+                # seeing any line
+                assert expected == ERROR, (fmt, expr.text)
+                continue
+            res = line_filter.check(line)
+            if isinstance(res, ErrorRecord):
+                assert expected == ERROR, (fmt, expr.text, line)
+            else:
+                # Prefilter may reject lines having invalid dates
+                assert res == (expected is True), (fmt, expr.text, line)
+
+            if None not in env.values():
+                postfix = parse(expr.text, fmt)
+                assert run_interpreter(postfix, env) == expected
+                assert run_compiled(postfix, env) == expected
+
+    @pytest.mark.parametrize("seed", SEEDS)
+    def test_prefilter_same_as_reference(self, seed):
+        rng = random.Random(seed)
+        for _ in range(300):
+            fmt = rng.choice(["%Y/%m/%d %H:%M", "%Y/%m/%d"])
+            special = rng.choice([None, None, "now", "today"])
+            if special is None:
+                # Truncated to the precision of fmt by strftime()
+                const = random_datetime(rng)
+                if const.year < 1000:
+                    # Not zero padded by strftime(), so can't be lexed
+                    continue
+                conststr = const.strftime(fmt)
+            else:
+                # 'now' is finer than fmt
+                const = datetime.datetime.now()
+                conststr = special
+            oprtr = rng.choice(sorted(COMPARATORS))
+            field_first = rng.random() < 0.5
+            if field_first:
+                exprstr = f"$1 {oprtr} {conststr}"
+            else:
+                exprstr = f"{conststr} {oprtr} $1"
+
+            before = datetime.datetime.now()
+            line_filter = LineFilter(exprstr, fmt, ",")
+            after = datetime.datetime.now()
+
+            value = const + rng.choice([-1, 0, 1]) * datetime.timedelta(
+                minutes=rng.choice([1, 60, 1440, 100000]))
+            text = value.strftime(fmt)
+            if rng.random() < 0.3:
+                # Not zero padded; can't be compared as string
+                text = text.replace("/0", "/")
+            parsed = ref_strptime(text, fmt)
+            if parsed is None:
+                continue
+
+            def check(const_val):
+                if special == "today":
+                    const_val = const_val.replace(hour=0, minute=0,
+                                                  second=0, microsecond=0)
+                elif special is None:
+                    const_val = ref_strptime(conststr, fmt)
+                if field_first:
+                    return COMPARATORS[oprtr](parsed, const_val)
+                return COMPARATORS[oprtr](const_val, parsed)
+
+            # Value of 'now' used by line_filter is between before and
+            # after
+            if check(before) == check(after):
+                assert line_filter(f"{text},x") == check(before), exprstr
+
+
+def throughput(func, inputs):
+    """
+    Find number of inputs processed per second by func.
+    """
+    start = time.perf_counter()
+    for inp in inputs:
+        func(inp)
+    return len(inputs) / (time.perf_counter() - start)
+
+
+def test_throughput(record_property):
+    """
+    Record the speed of each path on the same inputs. Run pytest with
+    --junitxml to save them, or with -s to see them.
+    """
+    cases = make_cases(0, 500)
+    fmt = "%Y/%m/%d"
+    exprs = [expr.text for case_fmt, expr in cases if case_fmt == fmt]
+    postfixes = []
+    for exprstr in exprs:
+        try:
+            postfixes.append(parse(exprstr, fmt))
+        except (ValueError, LexError):
+            pass
+
+    def interpret(postfix):
+        try:
+            eval_postfix(postfix)
+        except ValueError:
+            pass
+
+    def run_compiled_expr(compiled):
+        try:
+            compiled()
+        except (ValueError, OverflowError):
+            pass
+
+    def raising(exprstr):
+        try:
+            compute(exprstr, fmt)
+        except (ValueError, LexError):
+            pass
+
+    compiled = []
+    for postfix in postfixes:
+        try:
+            compiled.append(compile_postfix(postfix))
+        except (ValueError, OverflowError):
+            pass
+
+    rng = random.Random(0)
+    texts = [random_datetime(rng).strftime("%Y/%m/%d %H:%M:%S")
+             for _ in range(2000)]
+    patt = dtcalc.dtfmt.get_pattern("%Y/%m/%d %H:%M:%S")
+    # Years below 1000 aren't zero padded by strftime()
+    matches = [mobj for mobj in map(patt.fullmatch, texts)
+               if mobj is not None]
+    parse_match = dtcalc.dtfmt.get_parser("%Y/%m/%d %H:%M:%S")
+
+    rates = {
+        "strptime": throughput(
+            lambda text: ref_strptime(text, "%Y/%m/%d %H:%M:%S"), texts),
+        "fast_parser": throughput(parse_match, matches),
+        "compute": throughput(raising, exprs),
+        "try_compute": throughput(lambda inp: try_compute(inp, fmt), exprs),
+        "eval_postfix": throughput(interpret, postfixes),
+        "compiled": throughput(run_compiled_expr, compiled),
+    }
+    for path, rate in rates.items():
+        record_property(f"throughput_{path}", round(rate))
+    assert all(rate > 0 for rate in rates.values())
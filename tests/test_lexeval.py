@@ -3,9 +3,11 @@ import re
 
 import pytest
 
+from dtcalc.cache import ResultCache
 from dtcalc.lexeval import (next_tok, evaluate, infix_to_postfix,
                             eval_postfix, lexer, sunit_to_td,
-                            lexeval, LexError)
+                            lexeval, clock_key, compute, get_tokpatts,
+                            try_compute, parse, ErrorRecord, LexError)
 import dtcalc.tokens as tokens
 import dtcalc.dtfmt
 
@@ -16,7 +18,8 @@ def TOKPATTS():
         "LPAR": re.compile(r' *(?P<LPAR>\()'),
         "RPAR": re.compile(r' *(?P<RPAR>\))'),
         "OP": re.compile(r' *(?P<OP>\+|-)'),
-        "SUNIT": re.compile(r' *(?P<SUNIT>(?P<_SCALE>\d+)(?P<_UNIT>w|d|h|m))'),
+        "SUNIT": re.compile(r' *(?P<SUNIT>(?P<_SCALE>\d+)'
+                            r'(?P<_UNIT>mo|y|w|d|h|m))'),
         # "DTIME": dtcalc.dtfmt.get_pattern(INDTFMT),
     }
 
@@ -84,12 +87,20 @@ class TestNextTok:
          (tokens.SUNIT(0, 3, datetime.timedelta(days=2)), 3)),
         (" 32w ad", "%Y/%m/%d",
          (tokens.SUNIT(0, 4, datetime.timedelta(weeks=32)), 4)),
+        (" 18mo ad", "%Y/%m/%d",
+         (tokens.SUNIT(0, 5, datetime.timedelta(0), 18), 5)),
+        (" 2y ad", "%Y/%m/%d",
+         (tokens.SUNIT(0, 3, datetime.timedelta(0), 24), 3)),
         (" + ", "%Y/%m/%d", (tokens.OP(0, 2, "+"), 2)),
         ("- ", "%Y/%m/%d", (tokens.OP(0, 1, "-"), 1)),
+        (" <= ", "%Y/%m/%d", (tokens.OP(0, 3, "<="), 3)),
+        (" < ", "%Y/%m/%d", (tokens.OP(0, 2, "<"), 2)),
+        (" $ts ", "%Y/%m/%d", (tokens.FIELD(0, 4, "ts"), 4)),
         (" (d ad", "%Y/%m/%d", (tokens.LPAR(0, 2), 2)),
         (" ) d ad", "%Y/%m/%d", (tokens.RPAR(0, 2), 2)),
     ])
-    def test_valid(self, TOKPATTS, inp, indtfmt, expected):
+    def test_valid(self, inp, indtfmt, expected):
+        TOKPATTS = get_tokpatts(indtfmt)
         TOKPATTS["DTIME"] = dtcalc.dtfmt.get_pattern(indtfmt)
         assert next_tok(inp, TOKPATTS, indtfmt, 0) == expected
 
@@ -125,6 +136,36 @@ class TestEvaluate:
          tokens.DTIME(-1, -1, datetime.datetime(2021, 11, 10)),
          tokens.SUNIT(-1, -1, datetime.timedelta(days=10)),
          tokens.DTIME(-1, -1, datetime.datetime(2021, 10, 31))),
+
+        (tokens.OP(-1, -1, "+"),
+         tokens.DTIME(-1, -1, datetime.datetime(2021, 1, 31)),
+         tokens.SUNIT(-1, -1, datetime.timedelta(days=1), 1),
+         tokens.DTIME(-1, -1, datetime.datetime(2021, 3, 1))),
+
+        (tokens.OP(-1, -1, "+"),
+         tokens.SUNIT(-1, -1, datetime.timedelta(0), 12),
+         tokens.DTIME(-1, -1, datetime.datetime(2024, 2, 29)),
+         tokens.DTIME(-1, -1, datetime.datetime(2025, 2, 28))),
+
+        (tokens.OP(-1, -1, "-"),
+         tokens.DTIME(-1, -1, datetime.datetime(2021, 3, 31)),
+         tokens.SUNIT(-1, -1, datetime.timedelta(days=1), 1),
+         tokens.DTIME(-1, -1, datetime.datetime(2021, 2, 27))),
+
+        (tokens.OP(-1, -1, ">="),
+         tokens.DTIME(-1, -1, datetime.datetime(2021, 11, 10)),
+         tokens.DTIME(-1, -1, datetime.datetime(2021, 11, 11)),
+         tokens.BOOL(-1, -1, False)),
+
+        (tokens.OP(-1, -1, "=="),
+         tokens.SUNIT(-1, -1, datetime.timedelta(days=3), 1),
+         tokens.SUNIT(-1, -1, datetime.timedelta(days=3), 1),
+         tokens.BOOL(-1, -1, True)),
+
+        (tokens.OP(-1, -1, "-"),
+         tokens.SUNIT(-1, -1, datetime.timedelta(days=3), 18),
+         tokens.SUNIT(-1, -1, datetime.timedelta(days=1), 1),
+         tokens.SUNIT(-1, -1, datetime.timedelta(days=2), 17)),
     ])
     def test_valid(self, op, fst, snd, expected):
         assert evaluate(op, fst, snd) == expected
@@ -137,6 +178,18 @@ class TestEvaluate:
         (tokens.OP(-1, -1, "-"),
          tokens.SUNIT(-1, -1, datetime.timedelta(days=3)),
          tokens.DTIME(-1, -1, datetime.datetime(2021, 11, 10))),
+
+        (tokens.OP(-1, -1, "<"),
+         tokens.SUNIT(-1, -1, datetime.timedelta(days=3)),
+         tokens.DTIME(-1, -1, datetime.datetime(2021, 11, 10))),
+
+        (tokens.OP(-1, -1, "=="),
+         tokens.SUNIT(-1, -1, datetime.timedelta(days=3)),
+         tokens.SUNIT(-1, -1, datetime.timedelta(days=3), 1)),
+
+        (tokens.OP(-1, -1, "+"),
+         tokens.BOOL(-1, -1, True),
+         tokens.SUNIT(-1, -1, datetime.timedelta(days=3))),
     ])
     def test_invalid(self, op, fst, snd):
         with pytest.raises(ValueError):
@@ -187,6 +240,17 @@ def test_eval_postfix(toks, expected):
     assert eval_postfix(toks) == expected
 
 
+def test_eval_postfix_fields():
+    toks = [tokens.FIELD(0, 3, "ts"),
+            tokens.SUNIT(0, 2, datetime.timedelta(days=2)),
+            tokens.OP(0, 1, '+')]
+    fields = {"ts": datetime.datetime(2021, 9, 21)}
+    assert eval_postfix(toks, fields) == tokens.DTIME(
+        -1, -1, datetime.datetime(2021, 9, 23))
+    with pytest.raises(ValueError):
+        eval_postfix(toks)
+
+
 @pytest.mark.parametrize("inp,indtfmt,expected", [
     ("2021/09/21 +( 2d - 3w)", "%Y/%m/%d",
 
@@ -210,6 +274,14 @@ class TestLexEval:
          "-1 days"),  # datetime.datetime(2021, 11, 11)),
         (["2d"], "%Y/%m/%d", "%Y/%m/%d", "2 days"),
         (["(2d)"], "%Y/%m/%d", "%Y/%m/%d", "2 days"),
+        (["2021/05/31 + 18mo"], "%Y/%m/%d", "%Y/%m/%d", "2022/11/30"),
+        (["2020/02/29 - 1y"], "%Y/%m/%d", "%Y/%m/%d", "2019/02/28"),
+        (["1y + 2mo + 3d"], "%Y/%m/%d", "%Y/%m/%d",
+         "1 years, 2 months, 3 days"),
+        (["2021/11/09 - 2021/11/01 > 1w"], "%Y/%m/%d", "%Y/%m/%d", "True"),
+        (["2021/11/09 <= 2021/11/01 + 1w"], "%Y/%m/%d", "%Y/%m/%d",
+         "False"),
+        (["1y == 12mo"], "%Y/%m/%d", "%Y/%m/%d", "True"),
     ])
     def test_valid(self, inp, in_dtfmt, out_dtfmt, expected):
         assert lexeval(inp, in_dtfmt, out_dtfmt) == expected
@@ -222,6 +294,11 @@ class TestLexEval:
         (["2d 3d"], "%Y/%m/%d", "%Y/%m/%d"),
         (["(2d + 3d 4d)"], "%Y/%m/%d", "%Y/%m/%d"),
         (["(2d + (3d 4d))"], "%Y/%m/%d", "%Y/%m/%d"),
+        (["2d < 3d < 4d"], "%Y/%m/%d", "%Y/%m/%d"),
+        (["$1 + 3d"], "%Y/%m/%d", "%Y/%m/%d"),
+        (["+ 3d"], "%Y/%m/%d", "%Y/%m/%d"),
+        (["2021/02/29 + 3d"], "%Y/%m/%d", "%Y/%m/%d"),
+        (["9999/12/31 + 1d"], "%Y/%m/%d", "%Y/%m/%d"),
     ])
     def test_invalid(self, inp, in_dtfmt, out_dtfmt):
         with pytest.raises(ValueError):
@@ -236,3 +313,173 @@ class TestLexEval:
         with pytest.raises(LexError) as excinfo:
             lexeval(inp, in_dtfmt, out_dtfmt)
         assert excinfo.value.pos == errpos
+
+
+@pytest.mark.parametrize("inp,expected", [
+    ("2021/11/09 + 2d", None),
+    ("today + 2d", datetime.datetime(2021, 11, 9)),
+    ("now + 2d", datetime.datetime(2021, 11, 9, 10, 30, 12)),
+])
+def test_clock_key(inp, expected):
+    now = datetime.datetime(2021, 11, 9, 10, 30, 12)
+    assert clock_key(inp, now) == expected
+
+
+@pytest.mark.parametrize("inp,expected", [
+    ("2021/11/09 - 2021/11/10",
+     tokens.SUNIT(-1, -1, datetime.timedelta(days=-1))),
+    ("2021/11/09 + 1w",
+     tokens.DTIME(-1, -1, datetime.datetime(2021, 11, 16))),
+])
+def test_compute(inp, expected):
+    assert compute(inp, "%Y/%m/%d") == expected
+
+
+class TestLexEvalCache:
+    def test_hit(self):
+        cache = ResultCache()
+        for _ in range(3):
+            assert lexeval(["2021/11/09 + 2d"], "%Y/%m/%d",
+                           "%Y/%m/%d", cache) == "2021/11/11"
+        assert (cache.hits, cache.misses) == (2, 1)
+
+    def test_out_dtfmt_in_key(self):
+        cache = ResultCache()
+        lexeval(["2021/11/09 + 2d"], "%Y/%m/%d", "%Y/%m/%d", cache)
+        assert lexeval(["2021/11/09 + 2d"], "%Y/%m/%d", "%d.%m.%Y",
+                       cache) == "11.11.2021"
+        assert cache.misses == 2
+
+    def test_today(self):
+        cache = ResultCache()
+        today = datetime.date.today()
+        expected = (today + datetime.timedelta(days=2)).strftime("%Y/%m/%d")
+        assert lexeval(["today + 2d"], "%Y/%m/%d", "%Y/%m/%d",
+                       cache) == expected
+
+    def test_now_not_cached(self):
+        cache = ResultCache(4)
+        lexeval(["2021/01/01 + 1d"], "%Y/%m/%d", "%Y/%m/%d", cache)
+        for _ in range(5):
+            lexeval(["now + 1d"], "%Y/%m/%d", "%Y/%m/%d", cache)
+        assert len(cache) == 1
+        assert lexeval(["2021/01/01 + 1d"], "%Y/%m/%d", "%Y/%m/%d",
+                       cache) == "2021/01/02"
+        assert cache.hits == 1
+
+    def test_error_not_cached(self):
+        cache = ResultCache()
+        with pytest.raises(ValueError):
+            lexeval(["2d 3d"], "%Y/%m/%d", "%Y/%m/%d", cache)
+        assert len(cache) == 0
+
+
+class TestFunctions:
+    @pytest.mark.parametrize("inp,expected", [
+        ("floor(2021/06/01 10:37, 15m)",
+         tokens.DTIME(-1, -1, datetime.datetime(2021, 6, 1, 10, 30))),
+        ("ceil(2021/06/01 10:37, 15m)",
+         tokens.DTIME(-1, -1, datetime.datetime(2021, 6, 1, 10, 45))),
+        ("ceil(2021/06/01 10:45, 15m)",
+         tokens.DTIME(-1, -1, datetime.datetime(2021, 6, 1, 10, 45))),
+        # 1970/01/01 was a Thursday
+        ("floor(2021/06/01 10:37, 1w)",
+         tokens.DTIME(-1, -1, datetime.datetime(2021, 5, 27))),
+        ("floor(2021/06/01 10:37, 1w, 2021/01/04 00:00)",
+         tokens.DTIME(-1, -1, datetime.datetime(2021, 5, 31))),
+        ("floor(1969/12/31 23:59, 1h)",
+         tokens.DTIME(-1, -1, datetime.datetime(1969, 12, 31, 23))),
+        ("floor(100m, 15m)",
+         tokens.SUNIT(-1, -1, datetime.timedelta(minutes=90))),
+        ("ceil(100m, 15m, 5m)",
+         tokens.SUNIT(-1, -1, datetime.timedelta(minutes=110))),
+        ("floor(2021/06/01 10:37 - 1d, 1h) + 1h",
+         tokens.DTIME(-1, -1, datetime.datetime(2021, 5, 31, 11))),
+        ("ceil(floor(2021/06/01 10:37, 1d) - 1m, 1h)",
+         tokens.DTIME(-1, -1, datetime.datetime(2021, 6, 1))),
+        ("floor(2021/06/01 10:37, 1h) < 2021/06/01 10:30",
+         tokens.BOOL(-1, -1, True)),
+    ])
+    def test_valid(self, inp, expected):
+        assert compute(inp, "%Y/%m/%d %H:%M") == expected
+
+    @pytest.mark.parametrize("inp,expected", [
+        ("floor(2021/06/01 10:37+0530, 1h)", "2021/06/01 10:30+0530"),
+        ("floor(2021/06/01 10:37+0530, 1d)", "2021/06/01 05:30+0530"),
+        ("ceil(2021/06/01 10:37-0100, 1d, 2021/01/01 00:00-0100)",
+         "2021/06/02 00:00-0100"),
+    ])
+    def test_aware(self, inp, expected):
+        # Rounded in UTC, keeping the time zone
+        dtfmt = "%Y/%m/%d %H:%M%z"
+        assert lexeval([inp], dtfmt, dtfmt) == expected
+
+    def test_postfix(self):
+        postfix = parse("floor(2021/06/01 10:37 + 1h, (15m), 1h)",
+                        "%Y/%m/%d %H:%M")
+        assert [type(tok) for tok in postfix] == [
+            tokens.DTIME, tokens.SUNIT, tokens.OP, tokens.SUNIT,
+            tokens.SUNIT, tokens.FUNC]
+        assert postfix[-1] == tokens.FUNC(0, 5, "floor", 3)
+
+    @pytest.mark.parametrize("inp,expected", [
+        ("floor(2021/06/01 10:37)", ErrorRecord(0, 5, "syntax")),
+        ("floor(1d, 1h, 1m, 1m)", ErrorRecord(0, 5, "syntax")),
+        ("floor()", ErrorRecord(6, 7, "syntax")),
+        ("floor(1d,)", ErrorRecord(9, 10, "syntax")),
+        ("floor(, 1d)", ErrorRecord(6, 7, "syntax")),
+        ("1d, 1h", ErrorRecord(2, 3, "syntax")),
+        ("floor((1d, 1h))", ErrorRecord(9, 10, "syntax")),
+        ("floor(1d 1d, 1h)", ErrorRecord(-1, -1, "syntax")),
+        ("floor(1d, 1h", ErrorRecord(5, 6, "paren")),
+        ("floor 1d", ErrorRecord(0, 0, "lex")),
+        ("floor(2021/06/01 10:37, 1mo)", ErrorRecord(0, 5, "type")),
+        ("floor(1mo, 1d)", ErrorRecord(0, 5, "type")),
+        ("floor(1d, 2021/06/01 10:37)", ErrorRecord(0, 5, "type")),
+        ("floor(1d, 1h, 2021/06/01 10:37)", ErrorRecord(0, 5, "type")),
+        ("floor(1d < 2d, 1h)", ErrorRecord(0, 5, "type")),
+        ("floor(1d, 1h) + floor(1d, 0h)", ErrorRecord(16, 21, "range")),
+        ("ceil(9999/12/31 10:37, 1d)", ErrorRecord(0, 4, "range")),
+    ])
+    def test_error(self, inp, expected):
+        assert try_compute(inp, "%Y/%m/%d %H:%M") == expected
+
+
+class TestTryCompute:
+    @pytest.mark.parametrize("inp,expected", [
+        ("2d safd", ErrorRecord(3, 3, "lex")),
+        ("2021/02/29 + 3d", ErrorRecord(0, 10, "date")),
+        ("2d + (3d", ErrorRecord(5, 6, "paren")),
+        ("2d + 3d)", ErrorRecord(7, 8, "paren")),
+        ("2d +", ErrorRecord(3, 4, "syntax")),
+        ("2d 3d", ErrorRecord(3, 5, "syntax")),
+        ("()", ErrorRecord(-1, -1, "syntax")),
+        ("2021/02/28 +2021/02/27", ErrorRecord(11, 12, "type")),
+        ("9999/12/31 + 1d", ErrorRecord(11, 12, "range")),
+        ("2021/01/01 + 999999999999d", ErrorRecord(13, 26, "range")),
+        ("$1 + 3d", ErrorRecord(0, 2, "field")),
+    ])
+    def test_error(self, inp, expected):
+        assert try_compute(inp, "%Y/%m/%d") == expected
+
+    @pytest.mark.parametrize("inp,expected", [
+        ("2021/01/01+0530 > today", ErrorRecord(16, 17, "type")),
+        ("now - 2021/01/01+0530", ErrorRecord(4, 5, "type")),
+        ("floor(2021/01/01+0530, 1d, today)", ErrorRecord(0, 5, "type")),
+        ("2021/01/01+0530 - 2021/01/01+0000", tokens.SUNIT(
+            -1, -1, datetime.timedelta(hours=-5, minutes=-30))),
+    ])
+    def test_mixed_tz(self, inp, expected):
+        assert try_compute(inp, "%Y/%m/%d%z") == expected
+
+    def test_valid(self):
+        assert try_compute("2d + 1d", "%Y/%m/%d") == tokens.SUNIT(
+            -1, -1, datetime.timedelta(days=3))
+
+    @pytest.mark.parametrize("record,exctype", [
+        (ErrorRecord(3, 3, "lex"), LexError),
+        (ErrorRecord(0, 10, "date"), ValueError),
+        (ErrorRecord(-1, -1, "syntax"), ValueError),
+    ])
+    def test_exception(self, record, exctype):
+        assert isinstance(record.exception(), exctype)
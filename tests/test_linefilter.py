@@ -0,0 +1,110 @@
+import datetime
+
+import pytest
+
+from dtcalc.lexeval import compute, ErrorRecord, LexError
+from dtcalc.linefilter import LineFilter, field_index
+
+LINES = [
+    "a,2021/05/30,2021/05/01",
+    "b,2021/06/02,2021/06/01",
+    "c,bad,2021/05/01",
+    "d,2021/07/02,2021/06/01",
+    "e,2021/6/9,2021/06/01",
+    "f,2021/02/30,2021/06/01",
+    "g",
+]
+
+
+@pytest.mark.parametrize("expr,names,expected", [
+    ("$ts > 2021/06/01", ["id", "ts", "start"], ["b", "d", "e"]),
+    ("2021/06/01 >= $2", None, ["a"]),
+    ("$2 == 2021/06/09", None, ["e"]),
+    ("$ts - $start > 3d", ["id", "ts", "start"], ["a", "d", "e"]),
+    ("$2 < $3 + 1w", None, ["b"]),
+    ("$3 + 4w < 2021/06/01", None, ["a", "c"]),
+])
+def test_select(expr, names, expected):
+    line_filter = LineFilter(expr, "%Y/%m/%d", ",", names)
+    assert [line[0] for line in LINES if line_filter(line)] == expected
+
+
+@pytest.mark.parametrize("line,expected", [
+    ("b,2021/06/02,2021/06/01", False),
+    ("d,2021/07/02,2021/06/01", True),
+    ("c,bad,2021/05/01", ErrorRecord(0, 3, "field")),
+    ("f,2021/02/30,2021/06/01", ErrorRecord(0, 3, "date")),
+    ("g", ErrorRecord(0, 3, "field")),
+    ("h,2021/07/02,2021/13/01", ErrorRecord(6, 12, "field")),
+])
+def test_check(line, expected):
+    line_filter = LineFilter("$ts - $start > 3w", "%Y/%m/%d", ",",
+                             ["id", "ts", "start"])
+    assert line_filter.check(line) == expected
+
+
+def test_whitespace_delimiter():
+    line_filter = LineFilter("$2 > 2021/06/01", "%Y/%m/%d")
+    assert line_filter("x   2021/06/02  y")
+    assert not line_filter("x 2021/05/02 y")
+
+
+def test_whole_line():
+    line_filter = LineFilter("$0 > 2021/06/01", "%Y/%m/%d")
+    assert line_filter(" 2021/06/02 ")
+    assert not line_filter("2021/06/02 y")
+
+
+@pytest.mark.parametrize("expr,in_dtfmt,expected", [
+    ("$1 > 2021/06/01", "%Y/%m/%d", True),
+    ("2021/06/01 < $1", "%Y/%m/%d", True),
+    ("$1 + 1d > 2021/06/01", "%Y/%m/%d", False),
+    ("$1 > 01/06/2021", "%d/%m/%Y", False),
+    ("$1 > today", "%Y/%m/%d", True),
+    ("$1 > today", "%Y/%m/%d %H:%M", True),
+    ("$1 > now", "%Y/%m/%d %H:%M", False),
+])
+def test_has_prefilter(expr, in_dtfmt, expected):
+    line_filter = LineFilter(expr, in_dtfmt)
+    assert (line_filter._prefilter is not None) == expected
+
+
+@pytest.mark.parametrize("in_dtfmt", ["%Y/%m/%d", "%Y/%m/%d %H:%M"])
+def test_finer_constant(in_dtfmt):
+    # 'now' has more precision than the format; no prefilter is possible
+    line = datetime.datetime.now().strftime(in_dtfmt)
+    line_filter = LineFilter("$0 < now", in_dtfmt)
+    assert line_filter._prefilter is None
+    assert line_filter(line)
+    assert compute(f"{line} < now", in_dtfmt).value
+
+
+def test_unsortable_format():
+    line_filter = LineFilter("$1 > 01/06/2021", "%d/%m/%Y")
+    assert line_filter("02/06/2021")
+    assert not line_filter("31/05/2021")
+
+
+@pytest.mark.parametrize("expr", [
+    "$1 + 2d",
+    "($1 < 2021/06/01) + 2d",
+    "$ts > 2021/06/01",
+    "$1 > 2021/06/01 )",
+])
+def test_invalid(expr):
+    with pytest.raises(ValueError):
+        LineFilter(expr, "%Y/%m/%d")
+
+
+def test_lexerror():
+    with pytest.raises(LexError):
+        LineFilter("$1 > abc", "%Y/%m/%d")
+
+
+@pytest.mark.parametrize("name,names,expected", [
+    ("1", None, 0),
+    ("0", None, -1),
+    ("ts", ["id", "ts"], 1),
+])
+def test_field_index(name, names, expected):
+    assert field_index(name, names) == expected
@@ -0,0 +1,124 @@
+import io
+import runpy
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def run(monkeypatch, capsys):
+    """
+    Run dtcalc as from command line with given arguments and standard
+    input, and return what it printed to standard output and error.
+    """
+    def _run(args, stdin=""):
+        monkeypatch.setattr(sys, "argv", ["dtcalc"] + args)
+        monkeypatch.setattr(sys, "stdin", io.StringIO(stdin))
+        try:
+            runpy.run_module("dtcalc", run_name="__main__")
+        except SystemExit:
+            pass
+        return capsys.readouterr()
+    return _run
+
+
+@pytest.mark.parametrize("args,expected", [
+    (["2021/02/11 - 2021/01/11"], "4 weeks, 3 days\n"),
+    (["--out-dtfmt", "%d.%m.%Y", "2021/04/11", "+", "22w"], "12.09.2021\n"),
+    (["2d +"], "Error: Malformed input\n"),
+])
+def test_evaluate(run, args, expected):
+    assert run(args).out == expected
+
+
+def test_input_required(run):
+    assert "input is required" in run([]).err
+
+
+def test_aggregate(run, tmp_path):
+    errfile = tmp_path / "errors.tsv"
+    captured = run(["--aggregate", "--errors", str(errfile)],
+                   "2021/02/11 - 2021/02/10\n\n2021/02/30 - 2021/02/10\n"
+                   "2021/02/10\n1d + 2d\n")
+    assert captured.out.splitlines()[:3] == [
+        "count: 2", "min: 1 days", "max: 3 days"]
+    assert captured.err == "Skipped 2 lines (date: 1, result: 1)\n"
+    assert errfile.read_text() == ("3\t0\t10\tdate\t2021/02/30 - 2021/02/10\n"
+                                   "4\t-1\t-1\tresult\t2021/02/10\n")
+
+
+def test_aggregate_overflow(run):
+    captured = run(["--aggregate"],
+                   "2021/01/01 - 2020/01/01\n2021/01/01 + 999999999999d\n")
+    assert captured.out.splitlines()[0] == "count: 1"
+    assert captured.err == "Skipped 1 lines (range: 1)\n"
+
+
+@pytest.mark.parametrize("args", [
+    ["--filter", "$1 + 99999999999d > 2021/01/01"],
+    ["sort", "$1 + 99999999999d"],
+])
+def test_overflowing_expr(run, args):
+    assert run(args, "2021/01/01\n").out == "Error: Malformed input\n"
+
+
+@pytest.mark.parametrize("args", [
+    ["--filter", "$1 > today"],
+    ["sort", "$1 - now"],
+    ["2021/01/01+0530 > today"],
+])
+def test_mixed_tz(run, args):
+    captured = run(["--in-dtfmt", "%Y/%m/%d%z"] + args, "2021/01/01+0530\n")
+    assert captured.out == "Error: Malformed input\n"
+
+
+def test_aggregate_nothing(run):
+    captured = run(["--aggregate"], "2021/02/10\n")
+    assert captured.out == "No durations to summarize\n"
+    assert captured.err == "Skipped 1 lines (result: 1)\n"
+
+
+def test_filter(run, tmp_path):
+    errfile = tmp_path / "errors.tsv"
+    captured = run(["--filter", "--delimiter", ",", "--fields", "id,ts",
+                    "--errors", str(errfile), "$ts", ">", "2021/06/01"],
+                   "a,2021/06/02\nb,2021/05/31\nc,bad\nd,2021/07/01\n")
+    assert captured.out == "a,2021/06/02\nd,2021/07/01\n"
+    assert captured.err == "Skipped 1 lines (field: 1)\n"
+    assert errfile.read_text() == "3\t0\t3\tfield\tc,bad\n"
+
+
+def test_filter_malformed(run):
+    captured = run(["--filter", "$1 + 1d"], "2021/06/02\n")
+    assert captured.out == "Error: Malformed input\n"
+
+
+def test_sort(run, tmp_path):
+    infile = tmp_path / "in.csv"
+    infile.write_text("b,2021/06/02 10:00\na,2021/06/01 10:00\nc,bad\n")
+    errfile = tmp_path / "errors.tsv"
+    captured = run(["sort", "--delimiter", ",", "--in-dtfmt",
+                    "%Y/%m/%d %H:%M", "--buffer-lines", "1", "--temp-dir",
+                    str(tmp_path), "--errors", str(errfile), "$2 + 5h",
+                    str(infile)])
+    assert captured.out == "a,2021/06/01 10:00\nb,2021/06/02 10:00\n"
+    assert captured.err == "Skipped 1 lines (field: 1)\n"
+    assert errfile.read_text() == "3\t0\t2\tfield\tc,bad\n"
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "errors.tsv", "in.csv"]
+
+
+def test_sort_stdin(run):
+    captured = run(["sort", "--unique", "--fields", "id,ts", "$ts"],
+                   "x 2021/06/02\ny 2021/06/01\nz 2021/06/02\n")
+    assert captured.out == "y 2021/06/01\nx 2021/06/02\n"
+
+
+def test_sort_malformed(run):
+    captured = run(["sort", "$1 > 2021/06/01"], "2021/06/01\n")
+    assert captured.out == "Error: Malformed input\n"
+
+
+def test_sort_buffer_lines(run):
+    captured = run(["sort", "--buffer-lines", "0", "$1"], "2021/06/01\n")
+    assert "--buffer-lines must be positive" in captured.err
@@ -0,0 +1,112 @@
+import datetime
+import math
+import random
+
+import pytest
+
+from dtcalc.stats import DurationStats, td_to_us, hist_label
+
+
+@pytest.mark.parametrize("tdobj,expected", [
+    (datetime.timedelta(days=1), 86400_000000),
+    (datetime.timedelta(days=-1, microseconds=3), -86399_999997),
+    (datetime.timedelta(weeks=5000, microseconds=1), 3024000000_000001),
+])
+def test_td_to_us(tdobj, expected):
+    assert td_to_us(tdobj) == expected
+
+
+@pytest.mark.parametrize("usecs,expected", [
+    (0, "< 1 minutes"),
+    (59_999999, "< 1 minutes"),
+    (60_000000, ">= 1 minutes"),
+    (-86400_000000, "<= -1 days"),
+    (604800_000000 * 3, ">= 1 weeks"),
+])
+def test_hist_label(usecs, expected):
+    assert hist_label(usecs) == expected
+
+
+def make_stats(days):
+    stats = DurationStats()
+    for day in days:
+        stats.add(datetime.timedelta(days=day))
+    return stats
+
+
+class TestDurationStats:
+    def test_exact(self):
+        stats = make_stats([3, -2, 0, 7])
+        assert stats.count == 4
+        assert stats.min == td_to_us(datetime.timedelta(days=-2))
+        assert stats.max == td_to_us(datetime.timedelta(days=7))
+        assert stats.mean() == datetime.timedelta(days=2)
+        assert stats.histogram() == [("<= -1 days", 1), ("< 1 minutes", 1),
+                                     (">= 1 days", 1), (">= 1 weeks", 1)]
+
+    def test_quantile(self):
+        rng = random.Random(0)
+        days = [rng.uniform(-30, 300) for _ in range(5000)]
+        stats = make_stats(days)
+        days.sort()
+        for qval in (0, 0.25, 0.5, 0.9, 0.99, 1):
+            expected = days[max(math.ceil(qval * len(days)), 1) - 1]
+            got = stats.quantile(qval) / datetime.timedelta(days=1)
+            assert got == pytest.approx(expected, rel=0.011)
+
+    def test_merge(self):
+        days = list(range(-10, 90, 3))
+        whole = make_stats(days)
+        part = make_stats(days[:10])
+        part.merge(make_stats(days[10:]))
+        assert part.count == whole.count
+        assert (part.min, part.max) == (whole.min, whole.max)
+        assert part.mean() == whole.mean()
+        assert part.histogram() == whole.histogram()
+        for qval in (0, 0.1, 0.5, 0.9, 1):
+            assert part.quantile(qval) == whole.quantile(qval)
+
+    def test_merge_empty(self):
+        stats = DurationStats()
+        stats.merge(make_stats([4, 1]))
+        stats.merge(DurationStats())
+        assert stats.min == td_to_us(datetime.timedelta(days=1))
+        assert stats.count == 2
+
+    def test_merge_accuracy_mismatch(self):
+        with pytest.raises(ValueError):
+            DurationStats(0.01).merge(DurationStats(0.02))
+
+    def test_summary(self):
+        assert make_stats([1, 14]).summary().splitlines()[:4] == [
+            "count: 2", "min: 1 days", "max: 2 weeks",
+            "mean: 1 weeks, 12 hours"]
+
+    def test_quantile_exact(self):
+        stats = make_stats([1, 1, 1, -2, -2, 14])
+        assert stats.quantile(0.5) == datetime.timedelta(days=1)
+        assert stats.quantile(0.2) == datetime.timedelta(days=-2)
+        assert "p50: 1 days" in stats.summary().splitlines()
+
+    def test_quantile_few(self):
+        stats = make_stats([1, 31])
+        assert stats.quantile(0) == datetime.timedelta(days=1)
+        assert stats.quantile(0.5) == datetime.timedelta(days=1)
+        assert stats.quantile(0.9) == datetime.timedelta(days=31)
+        assert stats.quantile(0.99) == datetime.timedelta(days=31)
+        assert "p99: 4 weeks, 3 days" in stats.summary().splitlines()
+
+    @pytest.mark.parametrize("qval", [-0.1, 1.5])
+    def test_invalid_quantile(self, qval):
+        with pytest.raises(ValueError):
+            make_stats([1]).quantile(qval)
+
+    def test_empty(self):
+        with pytest.raises(ValueError):
+            DurationStats().mean()
+        with pytest.raises(ValueError):
+            DurationStats().quantile(0.5)
+
+    def test_invalid_accuracy(self):
+        with pytest.raises(ValueError):
+            DurationStats(1)